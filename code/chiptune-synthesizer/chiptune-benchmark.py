@@ -0,0 +1,363 @@
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from chiptune_loader import SYNTH_PATH, loadSynthesizer
+
+chiptune = loadSynthesizer()
+
+# Case every sweep starts from, varying one dimension at a time
+BASE_CASE = {"notes": 2000, "polyphony": 2, "instruments": 4, "seconds": 60}
+
+# Values each dimension takes in the default suite
+DEFAULT_SWEEPS = {
+    "notes": [500, 2000, 8000],
+    "polyphony": [1, 4, 8],
+    "instruments": [1, 4, 16],
+    "seconds": [30, 60, 240],
+}
+
+# Program numbers synthetic instruments cycle through, one per waveform the synthesizer maps programs to.
+# None stands for a drum kit.
+SYNTHETIC_PROGRAMS = [0, 32, 40, None] # Square, triangle, sawtooth, percussion
+
+# Drum keys synthetic drum kits play, every kind of drum sound including an unsupported one
+SYNTHETIC_DRUM_KEYS = [36, 38, 42, 46, 49]
+
+# Ticks per beat of synthetic MIDIs. They keep the default tempo of 120 BPM, so a second is 960 ticks.
+SYNTHETIC_RESOLUTION = 480
+
+# Small MIDI rendered by the cold start measurement, so startup dominates its time
+COLD_START_CASE = {"notes": 64, "polyphony": 1, "instruments": 4, "seconds": 4}
+
+# Modules slow to import, reported when a cold start loads them. Playback modules should never load headless.
+HEAVY_MODULES = ["mido", "pretty_midi", "scipy.io", "scipy.signal", "sounddevice"]
+PLAYBACK_MODULES = ["sounddevice"]
+
+# Run in a fresh interpreter by `coldStart`: loads the synthesizer, optionally renders a MIDI without playing
+# it, then reports its timings and loaded modules as JSON.
+COLD_START_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+from chiptune_loader import loadSynthesizer
+chiptune = loadSynthesizer(sys.argv[1])
+imported = time.perf_counter()
+if len(sys.argv) > 2:
+    chiptune.MidiToChiptune(sys.argv[2], False).saveWAV(sys.argv[3])
+print(json.dumps({"import_seconds": imported - started, "render_seconds": time.perf_counter() - imported,
+                  "modules": sorted(sys.modules)}))
+"""
+
+def variableLength(value):
+    """
+    Encodes a MIDI variable-length quantity, 7 bits per byte with the high bit set on all but the last byte.
+
+    Args:
+        value (int): The value to encode.
+
+    Returns:
+        bytes: The encoded quantity.
+    """
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+def writeMidi(midi_path, instruments):
+    """
+    Writes a format 1 MIDI file with one track per instrument, at the default tempo.
+
+    Args:
+        midi_path (str): Path to write the MIDI file to.
+        instruments (List[tuple]): Program, whether it is a drum kit, and a list of (start seconds, end seconds,
+            pitch, velocity) notes for each instrument.
+    """
+    ticks_per_second = 2 * SYNTHETIC_RESOLUTION
+    tracks = []
+    for index, (program, is_drum, notes) in enumerate(instruments):
+        # Drums play on channel 10, other instruments take the remaining channels in turn
+        channel = 9 if is_drum else [0, 1, 2, 3, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 15][index % 15]
+
+        # Note offs sort before note ons on the same tick, so repeated pitches never cut each other off
+        events = [(0, 0, bytes([0xC0 | channel, program]))]
+        for start, end, pitch, velocity in notes:
+            events.append((round(start * ticks_per_second), 2, bytes([0x90 | channel, pitch, velocity])))
+            events.append((round(end * ticks_per_second), 1, bytes([0x80 | channel, pitch, 0])))
+        events.sort(key=lambda event: event[:2])
+
+        track, tick = bytearray(), 0
+        for event_tick, _, message in events:
+            track += variableLength(event_tick - tick) + message
+            tick = event_tick
+        track += b'\x00\xff\x2f\x00' # End of track
+        tracks.append(struct.pack('>4sI', b'MTrk', len(track)) + track)
+
+    with open(midi_path, 'wb') as midi_file:
+        midi_file.write(struct.pack('>4sIHHH', b'MThd', 6, 1, len(tracks), SYNTHETIC_RESOLUTION))
+        midi_file.write(b''.join(tracks))
+
+def generateMidi(midi_path, notes, polyphony, instruments, seconds, seed=0):
+    """
+    Writes a synthetic MIDI with the given size, for benchmarking how synthesis scales. Notes are split evenly
+    between instruments, each playing chords of `polyphony` notes at evenly spaced onsets across the song.
+
+    Args:
+        midi_path (str): Path to write the MIDI file to.
+        notes (int): Total number of notes across every instrument.
+        polyphony (int): Number of notes each instrument sounds at once.
+        instruments (int): Number of instruments, cycling through melody, bass, orchestral and drum programs.
+        seconds (float): Length of the song in seconds.
+        seed (int): Seed for the random pitches and velocities. The same arguments give the same MIDI.
+
+    Returns:
+        int: The number of notes written, rounded down to whole chords per instrument.
+    """
+    rng = np.random.default_rng(seed)
+    chords = max(notes // (instruments * polyphony), 1)
+    spacing = seconds / chords
+    written = 0
+    midi_instruments = []
+
+    for index in range(instruments):
+        program = SYNTHETIC_PROGRAMS[index % len(SYNTHETIC_PROGRAMS)]
+        instrument_notes = []
+
+        for chord in range(chords):
+            start = chord * spacing
+            if program is None:
+                pitches = rng.choice(SYNTHETIC_DRUM_KEYS, polyphony)
+            else:
+                pitches = rng.integers(36 if program == 32 else 48, 84, polyphony)
+
+            for pitch in pitches:
+                velocity = int(rng.integers(60, 128))
+                instrument_notes.append((start, start + 0.9 * spacing, int(pitch), velocity))
+                written += 1
+        midi_instruments.append((program or 0, program is None, instrument_notes))
+
+    writeMidi(midi_path, midi_instruments)
+    return written
+
+def timeStage(stage, timings, memory):
+    """
+    Runs one stage of a render, recording its wall time and the peak memory traced while it ran.
+
+    Args:
+        stage (tuple): Name of the stage and a function running it, returning the stage's result.
+        timings (dict): Seconds spent per stage, filled in.
+        memory (dict): Peak traced megabytes per stage, filled in.
+
+    Returns:
+        The result of the stage's function.
+    """
+    name, run = stage
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    result = run()
+    timings[name] = time.perf_counter() - started
+    memory[name] = tracemalloc.get_traced_memory()[1] / 1e6
+    return result
+
+def benchmarkCase(case, output_dir, repeat=1, disable_adsr=False, precision="float64", instrument_workers=1, fixed_voices=False, draft=False,
+                  segment_workers=1, backend="numpy"):
+    """
+    Generates the MIDI of a case, then times parsing, synthesis, normalization and WAV writing separately.
+    With repeats, keeps the fastest time of every stage and the highest peak memory.
+
+    Args:
+        case (dict): Number of notes, polyphony, instruments and seconds of the synthetic MIDI.
+        output_dir (str): Directory to write the MIDI and WAV into.
+        repeat (int): Number of times to render the case.
+        disable_adsr (bool): Whether to disable applying an ADSR envelope.
+        precision (str): Floating point precision to render in.
+        instrument_workers (int): Number of instruments to render concurrently.
+        fixed_voices (bool): Whether to play notes on the synthesizer's fixed NES voices.
+        draft (bool): Whether to render quick, lower quality drafts.
+        segment_workers (int): Number of processes to render each case on, by segments of its timeline.
+        backend (str): Backend to synthesize notes with. The first render of the "numba" backend includes
+            compiling its kernel, repeats measure the compiled kernel.
+
+    Returns:
+        dict: The case, seconds and peak megabytes per stage, realtime factor and notes per second.
+    """
+    midi_path = os.path.join(output_dir, "benchmark.mid")
+    notes = generateMidi(midi_path, **case)
+    timings, memory = {}, {}
+
+    for _ in range(repeat):
+        run_timings, run_memory = {}, {}
+        tracemalloc.start()
+        synth = timeStage(("parse", lambda: chiptune.MidiToChiptune(midi_path, disable_adsr, render=False,
+            precision=precision, instrument_workers=instrument_workers, fixed_voices=fixed_voices, draft=draft,
+            segment_workers=segment_workers, backend=backend)), run_timings, run_memory)
+        timeStage(("synthesis", synth.synthesizeParts), run_timings, run_memory)
+        timeStage(("normalize", synth.mixdown), run_timings, run_memory)
+        timeStage(("write", lambda: synth.saveWAV(output_dir)), run_timings, run_memory)
+        tracemalloc.stop()
+
+        for stage in run_timings:
+            timings[stage] = min(timings.get(stage, np.inf), run_timings[stage])
+            memory[stage] = max(memory.get(stage, 0.0), run_memory[stage])
+
+    total = sum(timings.values())
+    audio_seconds = synth.track_length / synth.sample_rate
+    return {
+        "case": dict(case, notes=notes),
+        "backend": synth.backend,
+        "audio_seconds": audio_seconds,
+        "seconds": timings,
+        "total_seconds": total,
+        "peak_mb": memory,
+        "realtime_factor": audio_seconds / total,
+        "notes_per_second": notes / total,
+    }
+
+def coldStart(output_dir, repeat=3):
+    """
+    Measures how long a fresh process takes to load the synthesizer, and to load it and render a small MIDI
+    headless, as short-lived batch workers do. Keeps the fastest of `repeat` runs of each.
+
+    Args:
+        output_dir (str): Directory to write the MIDI and WAV into.
+        repeat (int): Number of fresh processes to start per measurement.
+
+    Returns:
+        dict: Wall seconds including interpreter startup, seconds importing and rendering, and the heavy
+            modules loaded for both the import only and headless render measurements.
+    """
+    midi_path = os.path.join(output_dir, "cold-start.mid")
+    generateMidi(midi_path, **COLD_START_CASE)
+
+    results = {}
+    for name, extra_args in (("import", []), ("headless_render", [midi_path, output_dir])):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, SYNTH_PATH, *extra_args],
+                                       capture_output=True, text=True, check=True)
+            wall_seconds = time.perf_counter() - started
+            run = json.loads(completed.stdout)
+            if best is None or wall_seconds < best["wall_seconds"]:
+                best = {
+                    "wall_seconds": wall_seconds,
+                    "import_seconds": run["import_seconds"],
+                    "render_seconds": run["render_seconds"],
+                    "heavy_modules": [module for module in HEAVY_MODULES if module in run["modules"]],
+                }
+        best["playback_loaded"] = any(module in best["heavy_modules"] for module in PLAYBACK_MODULES)
+        results[name] = best
+    return results
+
+def suiteCases(sweeps):
+    """
+    Expands sweeps into benchmark cases, each varying one dimension of `BASE_CASE`.
+
+    Args:
+        sweeps (dict): Values to try for each dimension.
+
+    Returns:
+        List[dict]: Distinct cases in sweep order.
+    """
+    cases = []
+    for dimension, values in sweeps.items():
+        for value in values:
+            case = dict(BASE_CASE, **{dimension: value})
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+def parseSweep(text):
+    """
+    Parses a `--sweep` argument of the form `dimension=value,value,...`.
+
+    Args:
+        text (str): The argument.
+
+    Returns:
+        tuple: The dimension and its list of values.
+
+    Raises:
+        argparse.ArgumentTypeError: If the dimension is unknown or the values are not numbers.
+    """
+    dimension, _, values = text.partition("=")
+    if dimension not in BASE_CASE:
+        raise argparse.ArgumentTypeError(f"unknown dimension {dimension}, choose from {', '.join(BASE_CASE)}")
+    try:
+        return dimension, [type(BASE_CASE[dimension])(value) for value in values.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"values of {dimension} must be numbers")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chiptune Synthesizer Benchmark")
+
+    # Optional Arguments
+    ap.add_argument('--sweep', type=parseSweep, action="append", help="Dimension and values to sweep, e.g. `notes=1000,4000`. Repeatable. Defaults to sweeping every dimension.")
+    ap.add_argument('--repeat', type=int, default=3, help="Number of renders per case, keeping the fastest. Defaults to 3.")
+    ap.add_argument('--json', default=None, help="File to write results to as JSON. Defaults to printing them.")
+    ap.add_argument('--disable-adsr', action="store_true", help="Disable applying an ADSR envelope.")
+    ap.add_argument('--precision', choices=chiptune.PRECISIONS, default="float64", help="Floating point precision to render in. Defaults to `float64`.")
+    ap.add_argument('--instrument-workers', type=int, default=1, help="Number of instruments to render concurrently. Defaults to 1.")
+    ap.add_argument('--segment-workers', type=int, default=1, help="Number of processes to render each case on, by segments of its timeline. Defaults to 1.")
+    ap.add_argument('--backend', choices=chiptune.BACKENDS, action="append", help="Backend to synthesize notes with. Repeat to compare backends on the same MIDIs. Defaults to `numpy`.")
+    ap.add_argument('--fixed-voices', action="store_true", help="Play notes on the NES's fixed voices, capping how many notes sound at once.")
+    ap.add_argument('--draft', action="store_true", help="Render quick, lower quality drafts instead of full quality.")
+    ap.add_argument('--cold-start', action="store_true", help="Only measure the startup time of fresh synthesizer processes.")
+    args = ap.parse_args()
+
+    if args.cold_start:
+        with tempfile.TemporaryDirectory() as output_dir:
+            report = {"python": platform.python_version(), "numpy": np.__version__, "cold_start": coldStart(output_dir, args.repeat)}
+
+        for name, result in report["cold_start"].items():
+            print(f"{name:<16} {result['wall_seconds']:.3f}s wall  {result['import_seconds']:.3f}s import  "
+                  f"{result['render_seconds']:.3f}s render  loaded: {', '.join(result['heavy_modules']) or 'none'}", file=sys.stderr)
+        if args.json:
+            with open(args.json, 'w') as json_file:
+                json.dump(report, json_file, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
+        raise SystemExit()
+
+    sweeps = dict(args.sweep) if args.sweep else DEFAULT_SWEEPS
+    backends = args.backend or ["numpy"]
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for case in suiteCases(sweeps):
+            # Every backend renders the same generated MIDI, the case's seed fixes its notes
+            for backend in backends:
+                result = benchmarkCase(case, output_dir, args.repeat, args.disable_adsr, args.precision, args.instrument_workers, args.fixed_voices, args.draft,
+                                       args.segment_workers, backend)
+                results.append(result)
+
+                stages = "  ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["seconds"].items())
+                print(f"{result['backend']:>6}  {result['realtime_factor']:7.1f}x realtime  {result['notes_per_second']:9.0f} notes/s  "
+                      f"{max(result['peak_mb'].values()):7.1f} MB  {stages}  {result['case']}", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "precision": args.precision,
+        "adsr": not args.disable_adsr,
+        "instrument_workers": args.instrument_workers,
+        "segment_workers": args.segment_workers,
+        "backends": backends,
+        "fixed_voices": args.fixed_voices,
+        "draft": args.draft,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
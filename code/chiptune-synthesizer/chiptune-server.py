@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import json
+import numpy as np
+import os
+import shutil
+import struct
+import tempfile
+import time
+import traceback
+import urllib.parse
+
+from chiptune_loader import loadSynthesizer
+
+chiptune = loadSynthesizer()
+
+# Port the server listens on over localhost HTTP, unless given a Unix socket.
+DEFAULT_PORT = 8416
+
+# Number of jobs allowed to wait for a worker. Beyond it, renders are answered with 503 and a Retry-After header
+# so a saturated server sheds load instead of queueing without bound.
+QUEUE_LIMIT = 16
+
+# Largest MIDI upload accepted, in bytes.
+MAX_UPLOAD_BYTES = 16 * 1024 ** 2
+
+# Number of most recent jobs the timing averages of the metrics cover.
+METRICS_WINDOW = 100
+
+# Seconds a rejected client is asked to wait before retrying.
+RETRY_AFTER_SECONDS = 1
+
+# Reason phrases of the HTTP statuses the server answers with.
+HTTP_STATUSES = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                 422: "Unprocessable Entity", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+# Oscillators each worker process keeps warm between jobs, by (noise seed, precision, sample rate).
+worker_oscillators = {}
+
+def workerOscillator(noise_seed, precision, sample_rate):
+    """
+    Returns the worker's oscillator for the given settings, building it on first use. Its wavetables and noise
+    table then carry over to every later job with the same settings.
+
+    Args:
+        noise_seed (int): Seed for the noise of percussion sounds.
+        precision (str): Floating point precision to render in.
+        sample_rate (int): Sample rate to render at.
+
+    Returns:
+        WavetableOscillator: The warm oscillator.
+    """
+    key = (noise_seed, precision, sample_rate)
+    if key not in worker_oscillators:
+        worker_oscillators[key] = chiptune.WavetableOscillator(noise_seed=noise_seed, dtype=np.dtype(precision),
+                                                               sample_rate=sample_rate)
+    return worker_oscillators[key]
+
+def initServerWorker():
+    """
+    Warms up a render worker process as it starts. Importing this module already loaded the synthesizer and
+    NumPy, so only the oscillator of default settings is built, ready for the first job.
+    """
+    workerOscillator(chiptune.NOISE_SEED, "float64", chiptune.SAMPLE_RATE)
+
+def renderJob(midi_path, output_dir, options):
+    """
+    Renders an uploaded MIDI to a WAV in a worker process, timing every stage.
+
+    Args:
+        midi_path (str): Path the uploaded MIDI was saved to.
+        output_dir (str): Directory to save the WAV into.
+        options (dict): `disable_adsr`, `precision`, `fixed_voices` and `draft` settings of the job.
+
+    Returns:
+        dict: Path of the WAV, seconds of audio, seconds of every stage and the worker's process ID. Or if the
+            upload can't be read as a MIDI, only `invalid_midi`, the reason why.
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    sample_rate = chiptune.DRAFT_SAMPLE_RATE if options["draft"] else chiptune.SAMPLE_RATE
+    oscillator = workerOscillator(chiptune.NOISE_SEED, options["precision"], sample_rate)
+    try:
+        synth = chiptune.MidiToChiptune(midi_path, options["disable_adsr"], render=False,
+                                        precision=options["precision"], fixed_voices=options["fixed_voices"],
+                                        draft=options["draft"], oscillator=oscillator)
+    # Returned rather than raised, so only failures of the server itself arrive as exceptions
+    except ValueError as error: # Malformed MIDI, the client's to fix
+        return {"invalid_midi": str(error).replace(midi_path, "the uploaded MIDI")}
+    except (IndexError, struct.error): # Events or chunks running past the end of the data
+        return {"invalid_midi": "the uploaded MIDI is truncated"}
+    timings = {"parse": time.perf_counter() - started}
+
+    for stage, run in (("synthesis", synth.synthesizeParts), ("normalize", synth.mixdown), ("write", lambda: synth.saveWAV(output_dir))):
+        stage_started = time.perf_counter()
+        run()
+        timings[stage] = time.perf_counter() - stage_started
+
+    return {
+        "wav_path": os.path.join(output_dir, f"{synth.track_name}.wav"),
+        "audio_seconds": synth.track_length / synth.sample_rate,
+        "timings": timings,
+        "worker_pid": os.getpid(),
+    }
+
+def parseOptions(query):
+    """
+    Reads the render settings of a job from the query string of its request.
+
+    Args:
+        query (dict): Parsed query string, from `urllib.parse.parse_qs`.
+
+    Returns:
+        dict: `disable_adsr`, `precision`, `fixed_voices` and `draft` settings for `renderJob`.
+
+    Raises:
+        ValueError: If the precision is not one of the synthesizer's `PRECISIONS`.
+    """
+    def flag(name):
+        return query.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+    precision = query.get("precision", ["float64"])[0]
+    if precision not in chiptune.PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(chiptune.PRECISIONS)}")
+
+    return {"disable_adsr": flag("disable_adsr"), "precision": precision, "fixed_voices": flag("fixed_voices"), "draft": flag("draft")}
+
+class RenderServer:
+    def __init__(self, workers=None, queue_limit=QUEUE_LIMIT, output_dir="output-wavs"):
+        """
+        Long-running render service. Uploaded MIDIs are queued as jobs and dispatched to a process pool whose
+        workers stay alive between jobs, keeping the synthesizer imported and their oscillators warm, so jobs
+        skip the startup of a fresh conversion process. Serves HTTP over localhost or a Unix socket with `serve`.
+
+        Args:
+            workers (int): Number of worker processes rendering jobs, defaults to the number of CPUs.
+            queue_limit (int): Number of jobs allowed to wait for a worker before new ones are rejected.
+            output_dir (str): Directory WAVs returned as paths are saved into, one subdirectory per job.
+        """
+        self.workers = workers or os.cpu_count()
+        self.queue_limit = queue_limit
+        self.output_dir = output_dir
+        self.job_ids = itertools.count(1)
+        self.queue = None # Created in the event loop by serve
+        self.pool = None # Started by serve, replaced by restartPool if it breaks
+
+        # Counters and the timings of recent jobs, reported by /metrics
+        self.started = time.time()
+        self.running = 0
+        self.counts = {"completed": 0, "failed": 0, "rejected": 0, "pool_restarts": 0}
+        self.max_queue_depth = 0
+        self.recent = collections.deque(maxlen=METRICS_WINDOW)
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+        """
+        Starts the worker pool and dispatchers, then answers requests until cancelled.
+
+        Args:
+            host (str): Address to listen on over HTTP.
+            port (int): Port to listen on over HTTP.
+            socket_path (str): Unix socket path to listen on instead of `host` and `port`, or None.
+        """
+        self.queue = asyncio.Queue(self.queue_limit)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initServerWorker)
+        try:
+            # One dispatcher per worker, so jobs only leave the queue once a worker is free to take them
+            dispatchers = [asyncio.ensure_future(self.dispatch()) for _ in range(self.workers)]
+
+            if socket_path:
+                server = await asyncio.start_unix_server(self.handle, path=socket_path)
+                print(f"Serving renders on {socket_path} with {self.workers} workers")
+            else:
+                server = await asyncio.start_server(self.handle, host, port)
+                print(f"Serving renders on http://{host}:{port} with {self.workers} workers")
+
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                for dispatcher in dispatchers:
+                    dispatcher.cancel()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def restartPool(self, broken_pool):
+        """
+        Replaces a worker pool that broke because one of its processes died (killed, out of memory, or crashed in
+        native code). Every job running on it fails at once, so only the first dispatcher to notice replaces it.
+
+        Args:
+            broken_pool (ProcessPoolExecutor): The pool that raised `BrokenProcessPool`.
+        """
+        if broken_pool is not self.pool: # Already replaced by another dispatcher
+            return
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initServerWorker)
+        self.counts["pool_restarts"] += 1
+        print(f"Restarted the worker pool after a worker process died ({self.counts['pool_restarts']} restarts)")
+
+    async def dispatch(self):
+        """
+        Takes queued jobs one at a time and renders each on the worker pool, resolving the job's future with the
+        result of `renderJob` plus the seconds it waited in the queue. A job whose pool broke under it is retried
+        once on a fresh pool, in case another job's worker took the pool down, then fails.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            queue_seconds = time.perf_counter() - job["queued"]
+            self.running += 1
+            try:
+                for attempt in range(2):
+                    pool = self.pool
+                    try:
+                        result = await loop.run_in_executor(pool, renderJob, job["midi_path"], job["output_dir"],
+                                                            job["options"])
+                        break
+                    except BrokenProcessPool:
+                        self.restartPool(pool)
+                        if attempt:
+                            raise
+
+                if "invalid_midi" in result:
+                    self.counts["failed"] += 1
+                else:
+                    result["timings"] = dict(queue=queue_seconds, **result["timings"])
+                    self.counts["completed"] += 1
+                    self.recent.append(result["timings"])
+                job["future"].set_result(result)
+            except Exception as error: # Reported to the job's client, the server keeps serving
+                self.counts["failed"] += 1
+                job["future"].set_exception(error)
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+
+    def metrics(self):
+        """
+        Summarizes the load on the server and how long recent jobs took.
+
+        Returns:
+            dict: Queue depth and limit, running jobs, worker count, job counts, restarts of the worker pool, uptime,
+                and the mean seconds of every stage (including time queued) over the last `METRICS_WINDOW` jobs.
+        """
+        stages = {}
+        for timings in self.recent:
+            for stage, seconds in timings.items():
+                stages.setdefault(stage, []).append(seconds)
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "queue_limit": self.queue_limit,
+            "running": self.running,
+            "workers": self.workers,
+            **self.counts,
+            "uptime_seconds": time.time() - self.started,
+            "mean_seconds": {stage: sum(seconds) / len(seconds) for stage, seconds in stages.items()},
+        }
+
+    async def render(self, query, body):
+        """
+        Queues an uploaded MIDI as a job and waits for it to render.
+
+        Args:
+            query (dict): Parsed query string: render settings (see `parseOptions`), the track `name`, and
+                `response`, "wav" to answer with the WAV's bytes or "path" for its path on the server.
+            body (bytes): The MIDI file.
+
+        Returns:
+            tuple: The HTTP status, headers and body to answer with.
+        """
+        try:
+            options = parseOptions(query)
+        except ValueError as error:
+            return self.jsonResponse(400, {"error": str(error)})
+        if not body.startswith(b"MThd"):
+            return self.jsonResponse(400, {"error": "the request body must be a MIDI file"})
+
+        job_id = next(self.job_ids)
+        name = os.path.basename(query.get("name", [f"job-{job_id}"])[0]) or f"job-{job_id}"
+        as_path = query.get("response", ["wav"])[0] == "path"
+
+        # Uploads are rendered from a scratch directory, WAVs returned by path are kept in the output directory
+        scratch_dir = tempfile.mkdtemp(prefix="chiptune-job-")
+        output_dir = os.path.join(self.output_dir, f"job-{job_id}") if as_path else scratch_dir
+        midi_path = os.path.join(scratch_dir, f"{name}.mid")
+        with open(midi_path, 'wb') as midi_file:
+            midi_file.write(body)
+
+        job = {"midi_path": midi_path, "output_dir": output_dir, "options": options,
+               "queued": time.perf_counter(), "future": asyncio.get_running_loop().create_future()}
+        try:
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull: # Backpressure, tell the client to retry rather than queue forever
+                self.counts["rejected"] += 1
+                return self.jsonResponse(503, {"error": "render queue is full", "queue_depth": self.queue.qsize()},
+                                         {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+            try:
+                result = await job["future"]
+            except Exception as error: # The server's fault rather than the MIDI's, logged here and not sent on
+                print(f"Job {job_id} failed: {name}")
+                traceback.print_exception(type(error), error, error.__traceback__)
+                return self.jsonResponse(500, {"job_id": job_id, "error": "the server failed to render the MIDI"})
+            if "invalid_midi" in result:
+                return self.jsonResponse(422, {"job_id": job_id, "error": result["invalid_midi"]})
+
+            timings = result["timings"]
+            realtime_factor = result["audio_seconds"] / (sum(timings.values()) - timings["queue"])
+            print(f"{realtime_factor:7.1f}x realtime\t{sum(timings.values()) - timings['queue']:6.2f}s\t"
+                  f"queued {timings['queue']:5.2f}s\tjob {job_id}: {name}")
+
+            if as_path:
+                return self.jsonResponse(200, dict(job_id=job_id, **result))
+
+            # Stage timings in milliseconds, readable by browser developer tools
+            server_timing = ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+            with open(result["wav_path"], 'rb') as wav_file:
+                wav = wav_file.read()
+            return 200, {"Content-Type": "audio/wav", "X-Job-Id": str(job_id), "Server-Timing": server_timing}, wav
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def jsonResponse(self, status, payload, headers=None):
+        """
+        Args:
+            status (int): HTTP status code.
+            payload (dict): Value to answer with as JSON.
+            headers (dict): Extra headers, if any.
+
+        Returns:
+            tuple: The HTTP status, headers and body to answer with.
+        """
+        return status, dict({"Content-Type": "application/json"}, **(headers or {})), json.dumps(payload).encode()
+
+    async def handle(self, reader, writer):
+        """
+        Answers one HTTP/1.1 request, then closes the connection.
+
+        Routes:
+            POST /render: Render the MIDI in the request body, see `render`.
+            GET /metrics: Queue depth, job counts and timings as JSON, see `metrics`.
+
+        Args:
+            reader (asyncio.StreamReader): The client's request.
+            writer (asyncio.StreamWriter): The connection to answer on.
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                field, _, value = line.partition(":")
+                headers[field.strip().lower()] = value.strip()
+
+            if len(request_line) != 3:
+                response = self.jsonResponse(400, {"error": "malformed request"})
+            else:
+                method, target, _ = request_line
+                url = urllib.parse.urlsplit(target)
+                query = urllib.parse.parse_qs(url.query)
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1 # Answered with 400 below, like a negative length
+
+                if url.path not in ("/render", "/metrics"):
+                    response = self.jsonResponse(404, {"error": f"no route {url.path}"})
+                elif url.path == "/metrics":
+                    response = self.jsonResponse(200, self.metrics()) if method == "GET" else self.jsonResponse(405, {"error": "use GET"})
+                elif method != "POST":
+                    response = self.jsonResponse(405, {"error": "use POST"})
+                elif length < 0:
+                    response = self.jsonResponse(400, {"error": "Content-Length must be a non-negative integer"})
+                elif length > MAX_UPLOAD_BYTES:
+                    response = self.jsonResponse(413, {"error": f"uploads are limited to {MAX_UPLOAD_BYTES} bytes"})
+                else:
+                    response = await self.render(query, await reader.readexactly(length))
+
+            status, response_headers, body = response
+            head = [f"HTTP/1.1 {status} {HTTP_STATUSES[status]}", f"Content-Length: {len(body)}", "Connection: close"]
+            head += [f"{field}: {value}" for field, value in response_headers.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError): # Client went away, nothing to answer
+            pass
+        finally:
+            writer.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chiptune Render Server")
+
+    # Optional Arguments
+    ap.add_argument('--host', default="127.0.0.1", help="Address to serve HTTP on. Defaults to `127.0.0.1`.")
+    ap.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to serve HTTP on. Defaults to {DEFAULT_PORT}.")
+    ap.add_argument('--socket', default=None, help="Unix socket path to serve HTTP on instead of a port.")
+    ap.add_argument('--workers', type=int, default=None, help="Number of worker processes. Defaults to the number of CPUs.")
+    ap.add_argument('--queue-limit', type=int, default=QUEUE_LIMIT, help=f"Number of jobs allowed to wait before rejecting new ones. Defaults to {QUEUE_LIMIT}.")
+    ap.add_argument('--output', default="output-wavs", help="Directory to save WAVs returned as paths into. Defaults to `output-wavs`.")
+    args = ap.parse_args()
+
+    render_server = RenderServer(args.workers, args.queue_limit, args.output)
+    try:
+        asyncio.run(render_server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        print("Stopped render server")
@@ -1,15 +1,31 @@
 import argparse
+import collections
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import functools
+import hashlib
+import json
 import numpy as np
 import os
-import pretty_midi # 0.2.10 release incompatible with Python 3.12: https://github.com/craffel/pretty-midi/pull/252
-import sounddevice as sd
-from scipy import signal
-from scipy.io.wavfile import write
-from typing import List
+import queue
+import shutil
+import struct
+import threading
+import time
+import tracemalloc
+from typing import List, NamedTuple
+import zipfile
 
-# The sample rate to produce chiptune audio with.
+# Heavy dependencies are imported where they are first needed, so a headless render never loads PortAudio
+# through `sounddevice` and short-lived workers start quickly. Run `chiptune-benchmark.py --cold-start` to
+# measure startup time.
+
+# The sample rate to produce chiptune audio with, unless a synthesizer is given its own.
 SAMPLE_RATE = 44100
 
+# The sample rate of draft renders, a quarter of `SAMPLE_RATE` for quick previews.
+DRAFT_SAMPLE_RATE = 11025
+
 # The multiplier to apply to the resulting chiptune track, for reducing overall volume if too loud.
 LOUDNESS = 0.40
 
@@ -27,375 +43,3042 @@ DRUM_KEY_MAP = {
     46: {"type": "noise", "base_volume": 0.6}, # Open Hi-Hat
 }
 
-class MidiToChiptune:
-    def __init__(self, input_midi, disable_adsr):
+# Drum sound for percussion notes with no entry in DRUM_KEY_MAP, quieter than supported drums.
+UNSUPPORTED_DRUM = {"type": "unsupported", "base_volume": 0.3}
+
+# ADSR envelope settings for each part of the chiptune track, as keyword arguments to `envelope`.
+ENVELOPES = {
+    "melody": {"tAttack": 0.05, "tDecay": 0.15, "tRelease": 0.2, "sustain_level": 0.75},
+    "bass": {"tAttack": 0.01, "tDecay": 0.1, "tRelease": 0.1, "sustain_level": 0.65},
+    # Percussion sounds naturally short, should not sustain a sound
+    "percussion": {"tAttack": 0.01, "tDecay": 0.05, "tRelease": 0.05, "sustain_level": 0.0},
+}
+
+# Number of note samples synthesized per grouped array operation when batch rendering an instrument.
+# Bounds the temporary arrays of dense instruments without falling back to a Python loop per note.
+BATCH_SAMPLES = 1 << 15
+
+# Number of samples in the single precomputed cycle of each wavetable waveform, must be a power of two.
+WAVETABLE_SIZE = 4096
+
+# Number of samples in the LFSR noise table read by noise-based drums, must be a power of two so reads can wrap with
+# a mask. One period of the 15-bit shift register (32767 steps) plus a repeat of its first step, so a read wrapping
+# around the table plays that step twice; inaudible in noise, and cheaper than wrapping modulo the exact period.
+NOISE_TABLE_SIZE = 1 << 15
+
+# Seed for the noise table, the starting state of its shift register, so the same seed always gives the same audio.
+NOISE_SEED = 0
+
+# Number of noise table offsets each noise-based drum sound alternates between from hit to hit. Repeated hits
+# still vary a little, while only a handful of distinct bodies per drum sound need rendering.
+DRUM_VARIANTS = 4
+
+# Maximum number of rendered drum hit bodies kept in the LRU cache of each synthesizer.
+DRUM_CACHE_SIZE = 256
+
+# Channels of the NES APU's sound hardware played by the fixed voice mode, and how many notes each plays at once.
+# Drums play on noise, triangle wave (bass) programs on triangle and every other program on pulse.
+VOICE_CHANNELS = {"pulse": 2, "triangle": 1, "noise": 1}
+
+# Number of samples rendered at a time by the block-based streaming renderer.
+BLOCK_SIZE = 4096
+
+# Length in samples of the time buckets a `NoteIndex` files notes under, about 1.5 seconds. Range renders look up
+# the buckets their window covers, so only the notes filed near the window are checked.
+INDEX_BUCKET_SIZE = 1 << 16
+
+# Number of samples per block when saving stems. Every block of the four WAVs is one thread pool task each, so
+# blocks are large enough that handing them to the pool costs little next to encoding them.
+STEM_BLOCK_SIZE = 1 << 16
+
+# Number of segments the timeline is cut into per worker for sharded renders, so a worker that draws a dense
+# stretch of the song doesn't hold up the others.
+SEGMENTS_PER_WORKER = 4
+
+# Parts of the chiptune track that instruments are mixed into.
+PARTS = ("melody", "bass", "percussion")
+
+# Number of rendered blocks to wait for before play-while-rendering starts audio output. These blocks also
+# serve as the lookahead for normalizing the track in a single pass.
+PREFILL_BLOCKS = 4
+
+# Number of blocks the play-while-rendering ring buffer holds, the renderer waits whenever it is full.
+PLAYBACK_BUFFER_BLOCKS = 32
+
+# Backends that synthesize melody and bass notes. "numba" compiles one fused kernel with Numba when installed.
+BACKENDS = ("numpy", "numba")
+
+# Formats renders can be saved in, with the `soundfile` format and subtype of the compressed ones.
+AUDIO_FORMATS = {"wav": None, "flac": ("FLAC", "PCM_16"), "ogg": ("OGG", "VORBIS")}
+
+# Number of converted blocks that may wait for the encoder thread of a compressed file, bounding memory while
+# letting synthesis run ahead of encoding.
+ENCODER_QUEUE_BLOCKS = 16
+
+# Floating point precisions audio can be rendered in. float32 halves the memory of every buffer, at the cost of
+# a slight change in output (see the README for the measured error).
+PRECISIONS = ("float64", "float32")
+
+# Tempo MIDI files play at until their first tempo change, in microseconds per beat (120 BPM).
+DEFAULT_TEMPO = 500000
+
+# Number of data bytes following the status byte of each kind of MIDI channel message, by its high nibble.
+# Program changes (0xC) and channel pressure (0xD) carry one, every other channel message two.
+CHANNEL_MESSAGE_SIZES = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+# Number of data bytes following system common and real-time status bytes, other than sysex (0xF0, 0xF7)
+# and meta (0xFF) events which carry their own length.
+SYSTEM_MESSAGE_SIZES = {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0}
+
+# Version of the compiled score layout written by `saveScore`, scores of other versions must be compiled again.
+SCORE_VERSION = 1
+
+# Size in bytes of the canonical 16-bit PCM WAV header written by `WAVWriter`.
+WAV_HEADER_SIZE = 44
+
+# Context returned in place of a profiling stage when profiling is off, so unprofiled renders do no extra work.
+NO_PROFILE = contextlib.nullcontext()
+
+# Version of the synthesis output, part of every render cache key. Bump whenever a change alters the audio
+# rendered for the same MIDI and settings, so stale cached renders are never returned.
+SYNTH_VERSION = 2
+
+# Directory of the on-disk render cache of finished chiptune WAVs.
+RENDER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "chiptune-synthesizer")
+
+# Maximum total size in bytes of the render cache, least recently used renders are evicted beyond it.
+RENDER_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Subdirectory of the render cache holding per-instrument stems, capped at `RENDER_CACHE_MAX_BYTES` separately.
+STEM_CACHE_SUBDIR = "stems"
+
+def synthSettings(disable_adsr, noise_seed=NOISE_SEED, precision="float64", fixed_voices=False, sample_rate=SAMPLE_RATE):
+    """
+    Collects every setting that affects synthesized audio, hashed into render and stem cache keys.
+
+    Args:
+        disable_adsr (bool): Whether the ADSR envelope is disabled.
+        noise_seed (int): Seed for the noise of percussion sounds.
+        precision (str): Floating point precision the audio is rendered in, one of `PRECISIONS`.
+        fixed_voices (bool): Whether notes are played on the fixed voices of `VOICE_CHANNELS`.
+        sample_rate (int): Sample rate the audio is rendered at.
+
+    Returns:
+        bytes: The settings serialized in a stable order.
+    """
+    settings = {
+        "synth_version": SYNTH_VERSION,
+        "sample_rate": sample_rate,
+        "loudness": LOUDNESS,
+        "adsr": not disable_adsr,
+        "drum_key_map": DRUM_KEY_MAP,
+        "envelopes": ENVELOPES,
+        "noise_seed": noise_seed,
+        "precision": precision,
+        "voice_channels": VOICE_CHANNELS if fixed_voices else None,
+    }
+    return json.dumps(settings, sort_keys=True).encode()
+
+def cacheStats(cached_function):
+    """
+    Summarizes how effective an LRU cache has been, for tuning its size.
+
+    Args:
+        cached_function (Callable): A function wrapped by `functools.lru_cache`.
+
+    Returns:
+        dict: Hits, misses, hit rate (0.0 to 1.0), and current / maximum number of cached results.
+    """
+    info = cached_function.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+@functools.lru_cache(maxsize=None)
+def lfsrNoise(seed=NOISE_SEED):
+    """
+    Generates the noise of the NES APU's noise channel: a 15-bit linear feedback shift register that shifts right
+    every step, feeding the XOR of its two lowest bits back into bit 14. The channel outputs its volume while bit 0
+    is clear and silence otherwise, centered here on -1 to 1 like the other waveforms. Cached per seed, since the
+    table is shared by every synthesizer using it.
+
+    Args:
+        seed (int): Chooses the starting state of the register. Every nonzero state lies on the same 32767 step
+            sequence, so different seeds start reading it at different points.
+
+    Returns:
+        np.ndarray: A read-only table of `NOISE_TABLE_SIZE` samples of -1 or 1: one 32767 step period followed
+            by its first step again.
+    """
+    # An all zero register would never change, so map the seed onto the 32767 nonzero states
+    register = seed % 0x7FFF + 1
+    bits = bytearray(0x7FFF)
+    for step in range(0x7FFF):
+        bits[step] = register & 1
+        feedback = (register ^ (register >> 1)) & 1
+        register = (register >> 1) | (feedback << 14)
+
+    table = 1.0 - 2.0 * np.resize(np.frombuffer(bits, dtype=np.uint8), NOISE_TABLE_SIZE)
+    table.setflags(write=False)
+    return table
+
+@functools.lru_cache(maxsize=None)
+def envelopeCurve(attack_samples, decay_samples, release_samples, sustain_level, dtype=np.float64):
+    """
+    Builds the ADSR curve shared by all notes, with the sustain stage collapsed onto a single sample. Each stage
+    ramps linearly including both of its endpoints, like `np.linspace`. Cached since only a few settings exist.
+
+    Args:
+        attack_samples (int): Length of the attack stage in samples.
+        decay_samples (int): Length of the decay stage in samples.
+        release_samples (int): Length of the release stage in samples.
+        sustain_level (float): Sustain level relative to the peak amplitude of 1.
+        dtype (np.dtype): Floating point type of the curve.
+
+    Returns:
+        np.ndarray: A read-only curve of the attack, decay, single sustain sample and release stages.
+    """
+    sustain_start = attack_samples + decay_samples
+    curve = np.concatenate([
+        np.linspace(0, 1, attack_samples), # Attack
+        np.linspace(1, sustain_level, decay_samples), # Decay
+        np.linspace(sustain_level, 0, release_samples), # Release
+    ])
+
+    # The first release sample doubles as the sustain sample, add one when there is no release stage
+    if len(curve) == sustain_start:
+        curve = np.append(curve, sustain_level)
+
+    curve = curve.astype(dtype)
+    curve.setflags(write=False)
+    return curve
+
+def fusedNotesKernel(track, track_start, starts, firsts, lasts, lengths, increments, volumes, velocities, table,
+                     curve, sustain_start, envelope_samples, apply_envelope):
+    """
+    Renders wavetable notes sample by sample straight into a track, fusing the phase accumulator, table read,
+    ADSR envelope and mix that `renderNotes` performs as whole-array operations. Meant to be compiled by
+    `numbaKernel`, which turns the loops into machine code that allocates no temporary arrays.
+
+    Args:
+        track (np.ndarray): The track to add the notes into, in place.
+        track_start (int): Sample of the song that the first sample of `track` holds.
+        starts (np.ndarray): Sample each note starts at in the song.
+        firsts (np.ndarray): First sample within each note to render.
+        lasts (np.ndarray): Sample after the last sample within each note to render.
+        lengths (np.ndarray): Full length of each note in samples, which its envelope is fitted to.
+        increments (np.ndarray): Phase advanced by each note every sample, in cycles.
+        volumes (np.ndarray): Volume of each note before the envelope.
+        velocities (np.ndarray): Velocity the envelope of each note is scaled by.
+        table (np.ndarray): One cycle of the waveform, a power of two samples long.
+        curve (np.ndarray): The ADSR curve from `envelopeCurve`.
+        sustain_start (int): Offset of the sustain sample in `curve`.
+        envelope_samples (int): Combined length of the attack, decay and release stages.
+        apply_envelope (bool): Whether to apply the envelope.
+    """
+    table_size = len(table)
+    index_mask = table_size - 1
+    for note in range(len(starts)):
+        position = starts[note] - track_start
+        sustain_samples = max(0, lengths[note] - envelope_samples)
+        for offset in range(firsts[note], lasts[note]):
+            # Same operations, in the same order, as the phase accumulator of `renderNotes` and `envelope`
+            sample = volumes[note] * table[int(offset * increments[note] * table_size) & index_mask]
+            if apply_envelope:
+                held = min(max(offset - sustain_start, 0), sustain_samples)
+                sample *= velocities[note] * curve[offset - held]
+            track[position + offset] += sample
+
+@functools.lru_cache(maxsize=None)
+def numbaKernel():
+    """
+    Compiles `fusedNotesKernel` with Numba on first use in a process, taking about a second per precision.
+    Numba is optional and imported here. The kernel releases the GIL, so instrument thread pools render on
+    several cores. Not cached on disk, as the CLI, benchmark and server load this file under different module
+    names, which Numba's cache can't tell apart.
+
+    Returns:
+        Callable: The compiled kernel, or None when Numba is not installed.
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+    return numba.njit(nogil=True)(fusedNotesKernel)
+
+class WavetableOscillator:
+    def __init__(self, table_size=WAVETABLE_SIZE, noise_seed=NOISE_SEED, dtype=np.float64, sample_rate=SAMPLE_RATE):
+        """
+        Precomputes one cycle of every supported basic waveform, so notes can be rendered by stepping a phase
+        accumulator through a table instead of evaluating `np.sin` / `scipy.signal.sawtooth` for every sample.
+
+        Args:
+            table_size (int): Number of samples in one waveform cycle, a power of two. Larger tables lower the
+                error of reading the nearest table sample.
+            noise_seed (int): Seed for the starting state of the LFSR noise table.
+            dtype (np.dtype): Floating point type of the tables, and so of every wave read from them.
+            sample_rate (int): Sample rate notes are rendered at.
+        """
+        self.table_size = table_size
+        self.sample_rate = sample_rate
+        self.index_mask = table_size - 1
+
+        # One cycle sampled at evenly spaced phases in [0, 1), matching how notes were once computed directly.
+        # Sawtooth and triangle use the same formulas as `scipy.signal.sawtooth` (width 1 and 0.5), giving
+        # identical tables without importing `scipy.signal` on every start.
+        phase = 2 * np.pi * np.arange(table_size) / table_size
+        cycles = {
+            'square': np.sign(np.sin(phase)),
+            'sawtooth': phase / np.pi - 1,
+            'triangle': np.where(phase < np.pi, phase / (0.5 * np.pi) - 1, (1.5 * np.pi - phase) / (0.5 * np.pi)),
+            'sine': np.sin(phase),
+        }
+        self.tables = {waveform: cycle.astype(dtype) for waveform, cycle in cycles.items()}
+
+        # NES-style shift register noise, within -1 to 1 amplitude to align with normalization
+        self.noise_table = lfsrNoise(noise_seed).astype(dtype)
+
+    def lookup(self, waveform, phase):
+        """
+        Reads a waveform table at the given phases, taking the nearest table sample at or before each phase.
+
+        Args:
+            waveform (str): The type of basic waveform table to read.
+            phase (np.ndarray): Phases in cycles, only the fractional part is used.
+
+        Returns:
+            np.ndarray: The waveform amplitudes (-1 to 1) at each phase.
+
+        Raises:
+            Exception: If the specified waveform type is unsupported.
+        """
+        if waveform not in self.tables:
+            raise Exception(f"{waveform} is not a supported waveform to generate.")
+        table = self.tables[waveform]
+
+        # Wrap whole cycles with a bit mask on the table index, cheaper than a float modulo on the phase
+        index = (phase * self.table_size).astype(np.int64)
+        index &= self.index_mask
+        return table[index]
+
+    def noise(self, positions):
+        """
+        Reads noise from the precomputed LFSR noise table. Reading the same positions always returns the same
+        noise, so a note sounds identical however its samples are split between blocks or render passes.
+
+        Args:
+            positions (np.ndarray): Integer positions to read, wrapping around the end of the table.
+
+        Returns:
+            np.ndarray: The noise amplitudes (-1 to 1) at each position.
+        """
+        return self.noise_table[positions & (NOISE_TABLE_SIZE - 1)]
+
+class TempoMap:
+    def __init__(self, resolution, tempo_changes):
+        """
+        Converts MIDI ticks to seconds across tempo changes. Between changes, every tick lasts the same number
+        of seconds, so a tick's time is the time its tempo segment starts plus its ticks into the segment.
+
+        Args:
+            resolution (int): Ticks per beat (quarter note) from the MIDI header.
+            tempo_changes (List[tuple]): (tick, microseconds per beat) of every tempo change in the conductor
+                track, in tick order. Tempo is 120 BPM until the first change.
+        """
+        # Seconds per tick of each segment, computed like pretty_midi so note times match it exactly
+        self.ticks = [0]
+        self.scales = [60.0 / ((6e7 / DEFAULT_TEMPO) * resolution)]
+        for tick, tempo in tempo_changes:
+            scale = 60.0 / ((6e7 / tempo) * resolution)
+            if tick == 0:
+                self.scales = [scale]
+            elif scale != self.scales[-1]: # Ignore repeats of the current tempo, which happen often
+                self.ticks.append(tick)
+                self.scales.append(scale)
+
+        # Time each segment starts at, accumulated over the segments before it
+        self.times = [0.0]
+        for index in range(1, len(self.ticks)):
+            self.times.append(self.times[-1] + self.scales[index - 1] * (self.ticks[index] - self.ticks[index - 1]))
+
+        self.ticks = np.array(self.ticks)
+        self.scales = np.array(self.scales)
+        self.times = np.array(self.times)
+
+    def seconds(self, ticks):
+        """
+        Args:
+            ticks (np.ndarray): Absolute MIDI ticks.
+
+        Returns:
+            np.ndarray: The time in seconds of each tick.
+        """
+        segment = np.searchsorted(self.ticks, ticks, side='right') - 1
+        return self.times[segment] + self.scales[segment] * (ticks - self.ticks[segment])
+
+class MidiInstrument(NamedTuple):
+    """
+    The notes one program plays on one channel of one track of a MIDI file, as columns with one entry per note.
+    Instruments are split the same way `pretty_midi` splits them.
+    """
+    name: str # Name of the track the instrument plays in
+    program: int # General MIDI program number, 0 to 127
+    is_drum: bool # Whether the instrument plays on the percussion channel (channel 10)
+    start: np.ndarray # Time the note starts in seconds
+    end: np.ndarray # Time the note ends in seconds
+    pitch: np.ndarray # MIDI note number
+    velocity: np.ndarray # MIDI velocity, 1 to 127
+
+class MidiFile(NamedTuple):
+    """
+    The contents of a MIDI file the synthesizer uses, read by `loadMidi`.
+    """
+    instruments: List[MidiInstrument] # Instruments in the order their first note ends, like pretty_midi
+    time_signatures: List[tuple] # (numerator, denominator, time in seconds) of each time signature change
+    key_signatures: List[tuple] # (sharps or negative flats, whether minor, time in seconds) of each key change
+
+class ScoreInstrument(NamedTuple):
+    """
+    An instrument of a compiled score, read by `loadScore`. Like `MidiInstrument`, but timed in samples at the
+    score's sample rate and with the frequency of every note already computed.
+    """
+    name: str # Name of the track the instrument plays in
+    program: int # General MIDI program number, 0 to 127
+    is_drum: bool # Whether the instrument plays on the percussion channel (channel 10)
+    start: np.ndarray # Sample the note starts at in the track
+    end: np.ndarray # Sample after the last sample of the note
+    pitch: np.ndarray # MIDI note number
+    frequency: np.ndarray # Frequency (Hz) of the pitch
+    velocity: np.ndarray # MIDI velocity, 1 to 127
+
+class Score(NamedTuple):
+    """
+    The contents of a compiled score the synthesizer uses, read by `loadScore`.
+    """
+    instruments: List[ScoreInstrument] # Instruments in the order of the MIDI they were compiled from
+    time_signatures: List[tuple] # (numerator, denominator, time in seconds) of each time signature change
+    key_signatures: List[tuple] # (sharps or negative flats, whether minor, time in seconds) of each key change
+    sample_rate: int # Sample rate the notes are timed at
+    track_length: int # Length of the track in samples
+
+def readVariableLength(data, position):
+    """
+    Reads a MIDI variable-length quantity, 7 bits per byte with the high bit set on all but the last byte.
+
+    Args:
+        data (bytes): The MIDI file.
+        position (int): Offset of the quantity's first byte.
+
+    Returns:
+        tuple: The value read and the offset just past it.
+    """
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, position
+
+def loadMidi(midi_path):
+    """
+    Reads the notes of a standard MIDI file straight into columnar NumPy arrays per instrument, without building
+    an object per event or note. Notes are paired, grouped into instruments and timed through the tempo map the
+    same way `pretty_midi` does, so note timings match it exactly at a fraction of its time and memory.
+
+    Out of range data bytes are clipped to 127 rather than rejected, so slightly malformed files still load.
+
+    Args:
+        midi_path (str): Path of the `.mid` file to read.
+
+    Returns:
+        MidiFile: The instruments and the time and key signature changes of the file.
+
+    Raises:
+        ValueError: If the file is not a MIDI file, uses SMPTE timing, or contains an undefined status byte.
+    """
+    with open(midi_path, 'rb') as midi_file:
+        data = midi_file.read()
+
+    if data[:4] != b'MThd' or len(data) < 14:
+        raise ValueError(f"{midi_path} is not a MIDI file, MThd header not found.")
+    header_size, _, track_count, resolution = struct.unpack('>IHHh', data[4:14])
+    if resolution <= 0:
+        raise ValueError(f"{midi_path} uses SMPTE time division, which is not supported.")
+
+    # Ticks stay integers until the tempo map is known, then every column is converted at once
+    tempo_changes, time_signatures, key_signatures = [], [], []
+    instrument_notes = {} # (program, channel, track) -> name, start ticks, end ticks, pitches, velocities
+    position = 8 + header_size
+    track = 0
+
+    while track < track_count and position + 8 <= len(data):
+        chunk_type, chunk_size = struct.unpack('>4sI', data[position:position + 8])
+        position += 8
+        end = min(position + chunk_size, len(data))
+        if chunk_type != b'MTrk': # Skip unknown chunks, as the MIDI specification asks
+            position = end
+            continue
+
+        track_name = ""
+        programs = [0] * 16 # Current program of each channel
+        open_notes = {} # (channel, pitch) -> [(start tick, velocity)] of notes not yet ended
+        tick = 0
+        running_status = None
+
+        while position < end:
+            # Most deltas fit in one byte, only longer ones need the general reader
+            delta = data[position]
+            if delta < 0x80:
+                position += 1
+            else:
+                delta, position = readVariableLength(data, position)
+            tick += delta
+
+            status = data[position]
+            if status < 0x80: # Running status, the byte is the first data byte of a repeated status
+                if running_status is None:
+                    raise ValueError(f"{midi_path} uses running status before any status byte.")
+                status = running_status
+            else:
+                position += 1
+                if status != 0xFF: # Meta events don't set running status
+                    running_status = status
+
+            if status == 0xFF:
+                meta_type = data[position]
+                length, position = readVariableLength(data, position + 1)
+                payload = data[position:position + length]
+                position += length
+
+                if meta_type == 0x03:
+                    track_name = payload.decode('latin1')
+                elif track == 0 and meta_type == 0x51:
+                    tempo_changes.append((tick, int.from_bytes(payload, 'big')))
+                elif track == 0 and meta_type == 0x58:
+                    time_signatures.append((tick, payload[0], 2 ** payload[1]))
+                elif track == 0 and meta_type == 0x59:
+                    key_signatures.append((tick, int.from_bytes(payload[:1], 'big', signed=True), payload[1] == 1))
+                continue
+
+            if status == 0xF0 or status == 0xF7:
+                length, position = readVariableLength(data, position)
+                position += length
+                continue
+
+            kind = status >> 4
+            if kind < 0xF:
+                size = CHANNEL_MESSAGE_SIZES[kind]
+            elif status in SYSTEM_MESSAGE_SIZES:
+                size = SYSTEM_MESSAGE_SIZES[status]
+            else:
+                raise ValueError(f"{midi_path} contains undefined status byte 0x{status:02x}.")
+
+            first = data[position] if size else 0
+            second = data[position + 1] if size == 2 else 0
+            position += size
+            if first > 127 or second > 127:
+                first, second = min(first, 127), min(second, 127)
+            channel = status & 0x0F
+
+            if kind == 0xC:
+                programs[channel] = first
+
+            elif kind == 0x9 and second > 0:
+                open_notes.setdefault((channel, first), []).append((tick, second))
+
+            elif (kind == 0x8 or kind == 0x9) and (channel, first) in open_notes:
+                # A note off ends every open note of its pitch, except notes started on this very tick, which
+                # only stay open if an earlier note was ended
+                key = (channel, first)
+                ending = [note for note in open_notes[key] if note[0] != tick]
+                starting = [note for note in open_notes[key] if note[0] == tick]
+
+                for start_tick, velocity in ending:
+                    instrument_key = (programs[channel], channel, track)
+                    if instrument_key not in instrument_notes:
+                        instrument_notes[instrument_key] = (track_name, [], [], [], [])
+                    _, starts, ends, pitches, velocities = instrument_notes[instrument_key]
+                    starts.append(start_tick)
+                    ends.append(tick)
+                    pitches.append(first)
+                    velocities.append(velocity)
+
+                if ending and starting:
+                    open_notes[key] = starting
+                else:
+                    del open_notes[key]
+
+        position = end
+        track += 1
+
+    tempo_map = TempoMap(resolution, tempo_changes)
+    instruments = []
+    for (program, channel, _), (name, starts, ends, pitches, velocities) in instrument_notes.items():
+        instruments.append(MidiInstrument(
+            name=name,
+            program=program,
+            is_drum=channel == 9,
+            start=tempo_map.seconds(np.array(starts, dtype=np.int64)),
+            end=tempo_map.seconds(np.array(ends, dtype=np.int64)),
+            pitch=np.array(pitches, dtype=np.int64),
+            velocity=np.array(velocities, dtype=np.int64),
+        ))
+
+    return MidiFile(
+        instruments=instruments,
+        time_signatures=[(numerator, denominator, float(tempo_map.seconds(tick)))
+                         for tick, numerator, denominator in time_signatures],
+        key_signatures=[(key, minor, float(tempo_map.seconds(tick))) for tick, key, minor in key_signatures],
+    )
+
+def memmapNpz(npz_path):
+    """
+    Memory-maps every array of an uncompressed `.npz` file, like `np.load(..., mmap_mode='r')` does for a single
+    `.npy` file. Arrays are read from disk as they are used, rather than all read into memory up front.
+
+    Args:
+        npz_path (str): Path of an `.npz` file written by `np.savez`.
+
+    Returns:
+        dict: Read-only arrays by name.
+
+    Raises:
+        ValueError: If an array of the file is compressed.
+    """
+    arrays = {}
+    with zipfile.ZipFile(npz_path) as archive, open(npz_path, 'rb') as npz_file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{npz_path} is compressed, save it with np.savez to memory-map it.")
+
+            # The array's .npy data follows its local file header, whose name and extra field lengths are at byte 26
+            npz_file.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', npz_file.read(4))
+            npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(npz_file)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(npz_file)
+
+            name = info.filename.removesuffix('.npy')
+            if 0 in shape: # Nothing to map, mmap rejects empty regions
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(npz_path, dtype=dtype, mode='r', offset=npz_file.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+def loadScore(score_path):
+    """
+    Loads a score compiled by `saveScore`. Its columns are memory-mapped and sliced into instruments without
+    parsing or converting anything.
+
+    Args:
+        score_path (str): Path of the `.npz` score.
+
+    Returns:
+        Score: The instruments and the time and key signature changes of the score.
+
+    Raises:
+        ValueError: If the file is not a score of the current `SCORE_VERSION`.
+    """
+    columns = memmapNpz(score_path)
+    if "score_version" not in columns or int(columns["score_version"]) != SCORE_VERSION:
+        raise ValueError(f"{score_path} is not a version {SCORE_VERSION} score, compile it again with --compile-score.")
+
+    # Notes of every instrument are stored back to back, instrument i owns offsets[i] to offsets[i + 1]
+    offsets = columns["instrument_offsets"].tolist()
+    instruments = [ScoreInstrument(
+        name=str(name),
+        program=int(program),
+        is_drum=bool(is_drum),
+        start=columns["start"][first:last],
+        end=columns["end"][first:last],
+        pitch=columns["pitch"][first:last],
+        frequency=columns["frequency"][first:last],
+        velocity=columns["velocity"][first:last],
+    ) for name, program, is_drum, first, last in zip(columns["name"], columns["program"], columns["is_drum"], offsets, offsets[1:])]
+
+    return Score(
+        instruments=instruments,
+        time_signatures=[(int(numerator), int(denominator), float(time)) for numerator, denominator, time in columns["time_signatures"]],
+        key_signatures=[(int(key), bool(minor), float(time)) for key, minor, time in columns["key_signatures"]],
+        sample_rate=int(columns["sample_rate"]),
+        track_length=int(columns["track_length"]),
+    )
+
+class NoteArrays(NamedTuple):
+    """
+    Columnar note data for one instrument, with one entry per note, used for batched synthesis.
+    """
+    start: np.ndarray # Sample the note starts at in the track
+    length: np.ndarray # Duration of the note in samples
+    pitch: np.ndarray # MIDI note number
+    frequency: np.ndarray # Frequency (Hz) of the pitch
+    velocity: np.ndarray # MIDI velocity normalized to 0.0–1.0
+
+class NoteGroup(NamedTuple):
+    """
+    Notes of one instrument that share a part, waveform and envelope, rendered together by `renderNotes`.
+    """
+    part: str # Part of the track the notes are mixed into, one of PARTS
+    waveform: str # Wavetable the notes read, or "noise" for noise-based drums
+    envelope: str # Key of the ADSR settings in ENVELOPES
+    notes: NoteArrays
+    volume: np.ndarray # Volume of each note before the envelope
+    increment: np.ndarray # Phase advanced by each note every sample, in cycles
+    noise_start: np.ndarray # Noise table position each note starts reading from, None for wavetables
+
+class NoteScheduler:
+    def __init__(self, groups: List[NoteGroup]):
+        """
+        Orders the notes of every note group by start sample, so the block renderer can find the notes sounding
+        during each block without scanning the whole song. Blocks must be requested in increasing order.
+
+        Args:
+            groups (List[NoteGroup]): Every note group of the track.
+        """
+        self.groups = groups
+        self.orders = [np.argsort(group.notes.start, kind='stable') for group in groups]
+        self.sorted_starts = [group.notes.start[order] for group, order in zip(groups, self.orders)]
+
+        # Per group, the position in its order of the next note to start, and the notes currently sounding
+        self.next_notes = [0] * len(groups)
+        self.active_notes = [np.empty(0, dtype=np.int64) for _ in groups]
+
+    def activeNotes(self, block_start, block_end):
+        """
+        Advances the scheduler to a block, starting notes that begin before it ends and retiring notes that
+        ended before it began.
+
+        Args:
+            block_start (int): First sample of the block.
+            block_end (int): Sample after the last sample of the block.
+
+        Yields:
+            tuple (group, note_indices): Each note group with notes sounding during the block, and their indices.
+        """
+        for i, group in enumerate(self.groups):
+            # Notes starting before the end of the block join the active notes
+            started = np.searchsorted(self.sorted_starts[i], block_end, side='left')
+            active = np.concatenate((self.active_notes[i], self.orders[i][self.next_notes[i]:started]))
+            self.next_notes[i] = started
+
+            # Notes that finished before the block begins will not sound again
+            active = active[group.notes.start[active] + group.notes.length[active] > block_start]
+            self.active_notes[i] = active
+
+            if len(active):
+                yield group, active
+
+class NoteIndex:
+    def __init__(self, notes: NoteArrays, bucket_size=INDEX_BUCKET_SIZE):
+        """
+        Interval index over the notes of a note group, for finding the notes sounding during any window of the
+        song without scanning every note. Time is cut into fixed size buckets and every note is filed under each
+        bucket it sounds during, so a note that started long before a window is still found through the
+        window's buckets. Unlike `NoteScheduler`, windows can be looked up in any order.
+
+        Args:
+            notes (NoteArrays): The notes to index.
+            bucket_size (int): Length of each bucket in samples.
+        """
+        self.bucket_size = bucket_size
+        self.starts = notes.start
+        self.ends = notes.start + notes.length
+
+        # Range of buckets each note covers, notes without samples are filed under the bucket they start in
+        first_buckets = self.starts // bucket_size
+        last_buckets = np.maximum(self.ends - 1, self.starts) // bucket_size
+        counts = last_buckets - first_buckets + 1
+
+        # One entry per (bucket, note) pair, grouped by bucket in CSR form: the notes of bucket b are
+        # bucket_notes[bucket_offsets[b]:bucket_offsets[b + 1]]
+        note_ids = np.repeat(np.arange(len(counts)), counts)
+        steps = np.arange(len(note_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        buckets = np.repeat(first_buckets, counts) + steps
+        order = np.argsort(buckets, kind='stable')
+        self.bucket_notes = note_ids[order]
+        num_buckets = int(last_buckets.max()) + 1 if len(counts) else 0
+        self.bucket_offsets = np.searchsorted(buckets[order], np.arange(num_buckets + 1))
+
+    def overlapping(self, window_start, window_end):
+        """
+        Finds the notes sounding during a window, including notes that started before it.
+
+        Args:
+            window_start (int): First sample of the window.
+            window_end (int): Sample after the last sample of the window.
+
+        Returns:
+            np.ndarray: Indices of the notes with samples inside the window, in increasing order.
+        """
+        num_buckets = len(self.bucket_offsets) - 1
+        first_bucket = min(max(window_start, 0) // self.bucket_size, num_buckets)
+        last_bucket = min(max(window_end - 1, 0) // self.bucket_size + 1, num_buckets)
+
+        # Notes covering several buckets of the window are filed under each, keep one of each
+        candidates = np.unique(self.bucket_notes[self.bucket_offsets[first_bucket]:self.bucket_offsets[last_bucket]])
+        sounding = (self.starts[candidates] < window_end) & (self.ends[candidates] > window_start)
+        return candidates[sounding]
+
+class AudioRingBuffer:
+    def __init__(self, capacity, dtype=np.float64):
+        """
+        A bounded ring buffer of audio samples, passing rendered blocks from a background renderer thread to
+        the `sounddevice` output callback. Writers wait while the buffer is full, readers never wait.
+
+        Args:
+            capacity (int): Maximum number of samples the buffer holds.
+            dtype (np.dtype): Floating point type of the samples.
+        """
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.read_position = 0
+        self.size = 0
+        self.finished = False # Set by the writer once nothing more will be written
+        self.condition = threading.Condition()
+
+    def write(self, samples):
+        """
+        Appends samples to the buffer, waiting for the reader to free up space whenever the buffer is full.
+
+        Args:
+            samples (np.ndarray): The audio samples to append.
+        """
+        written = 0
+        with self.condition:
+            while written < len(samples):
+                self.condition.wait_for(lambda: self.size < self.capacity)
+
+                count = min(self.capacity - self.size, len(samples) - written)
+                write_position = (self.read_position + self.size) % self.capacity
+                # Wrap around the end of the buffer if needed
+                first = min(count, self.capacity - write_position)
+                self.buffer[write_position:write_position + first] = samples[written:written + first]
+                self.buffer[:count - first] = samples[written + first:written + count]
+
+                self.size += count
+                written += count
+                self.condition.notify_all()
+
+    def read(self, out):
+        """
+        Copies as many buffered samples as are available into `out`, without waiting for more.
+
+        Args:
+            out (np.ndarray): The array to fill, typically the output callback's buffer.
+
+        Returns:
+            int: Number of samples copied, less than `len(out)` if the buffer ran short.
+        """
+        with self.condition:
+            count = min(len(out), self.size)
+            first = min(count, self.capacity - self.read_position)
+            out[:first] = self.buffer[self.read_position:self.read_position + first]
+            out[first:count] = self.buffer[:count - first]
+
+            self.read_position = (self.read_position + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+            return count
+
+    def finish(self):
+        """
+        Marks that the writer is done, so readers can tell the end of the track apart from an underrun.
+        """
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def waitFor(self, samples):
+        """
+        Waits until at least the given number of samples are buffered, or the writer has finished.
+
+        Args:
+            samples (int): Number of samples to wait for.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.size >= min(samples, self.capacity) or self.finished)
+
+class WAVWriter:
+    def __init__(self, wav_path, sample_rate=SAMPLE_RATE, length=None, memmap=False):
+        """
+        Writes a mono 16-bit PCM WAV file incrementally, block by block as audio is produced, so saving a song
+        never needs the whole track converted in memory. The header is written up front and its sizes patched
+        once the writer is closed. Use it as a context manager to close it automatically.
+
+        Args:
+            wav_path (str): Path of the WAV file to create.
+            sample_rate (int): Sample rate of the audio.
+            length (int): Number of samples that will be written, required with `memmap`.
+            memmap (bool): Whether to preallocate the file and write blocks into a memory-mapped view of it,
+                rather than appending them with file writes.
+
+        Raises:
+            ValueError: If `memmap` is requested without a `length`.
+        """
+        if memmap and length is None:
+            raise ValueError("A memory-mapped WAV needs its length in samples up front.")
+
+        self.wav_path = wav_path
+        self.sample_rate = sample_rate
+        self.samples = 0
+        self.file = open(wav_path, 'w+b')
+        self.file.write(self.header(length or 0))
+
+        self.memmap = None
+        if memmap:
+            self.file.truncate(WAV_HEADER_SIZE + 2 * length)
+            self.file.flush()
+            self.memmap = np.memmap(self.file, dtype='<i2', mode='r+', offset=WAV_HEADER_SIZE, shape=(length,))
+
+    def header(self, samples):
+        """
+        Builds the RIFF / WAVE header of a mono 16-bit PCM file.
+
+        Args:
+            samples (int): Number of samples in the data chunk.
+
+        Returns:
+            bytes: The `WAV_HEADER_SIZE` byte header.
+        """
+        data_size = 2 * samples
+        return struct.pack('<4sI4s4sIHHIIHH4sI',
+            b'RIFF', WAV_HEADER_SIZE - 8 + data_size, b'WAVE',
+            b'fmt ', 16, 1, 1, self.sample_rate, 2 * self.sample_rate, 2, 16, # PCM, mono, 16 bits per sample
+            b'data', data_size)
+
+    def write(self, block):
+        """
+        Converts a block of audio to 16-bit samples and appends it to the file.
+
+        Args:
+            block (np.ndarray): Audio in the range -1 to 1.
+
+        Raises:
+            ValueError: If more samples are written to a memory-mapped file than its length.
+        """
+        pcm = (block * 32767).astype('<i2')
+
+        if self.memmap is not None:
+            if self.samples + len(pcm) > len(self.memmap):
+                raise ValueError(f"Memory-mapped WAV only holds {len(self.memmap)} samples.")
+            self.memmap[self.samples:self.samples + len(pcm)] = pcm
+        else:
+            self.file.write(pcm.tobytes())
+        self.samples += len(pcm)
+
+    def close(self):
+        """
+        Patches the header with the number of samples written, then closes the file.
+        """
+        if self.memmap is not None:
+            self.memmap.flush()
+            self.memmap = None
+            # Drop any preallocated samples that were never written
+            self.file.truncate(WAV_HEADER_SIZE + 2 * self.samples)
+
+        self.file.seek(0)
+        self.file.write(self.header(self.samples))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class EncodedWriter:
+    def __init__(self, path, sample_rate=SAMPLE_RATE, audio_format="flac", queue_blocks=ENCODER_QUEUE_BLOCKS):
+        """
+        Writes a mono FLAC or OGG Vorbis file incrementally with `soundfile`, block by block as audio is
+        produced. Blocks are encoded on a separate thread, which overlaps with synthesis since libsndfile
+        releases the GIL while encoding. Shares the interface of `WAVWriter`, use it as a context manager to
+        finish encoding and close it automatically.
+
+        Args:
+            path (str): Path of the file to create.
+            sample_rate (int): Sample rate of the audio.
+            audio_format (str): "flac" or "ogg", a compressed format of `AUDIO_FORMATS`.
+            queue_blocks (int): Number of blocks that may wait to be encoded before `write` blocks.
+        """
+        import soundfile as sf
+
+        file_format, subtype = AUDIO_FORMATS[audio_format]
+        self.path = path
+        self.file = sf.SoundFile(path, 'w', samplerate=sample_rate, channels=1, format=file_format, subtype=subtype)
+        self.blocks = queue.Queue(maxsize=queue_blocks)
+        self.error = None
+        self.encoder = threading.Thread(target=self.encode, daemon=True)
+        self.encoder.start()
+
+    def encode(self):
+        """
+        Encodes queued blocks until `close` queues None. Runs on the encoder thread.
+        """
+        while (pcm := self.blocks.get()) is not None:
+            # Keep draining after a failure, so `write` never waits on a full queue
+            if self.error is None:
+                try:
+                    self.file.write(pcm)
+                except Exception as error:
+                    self.error = error
+
+    def write(self, block):
+        """
+        Converts a block of audio to 16-bit samples and queues it for the encoder thread.
+
+        Args:
+            block (np.ndarray): Audio in the range -1 to 1.
+
+        Raises:
+            Exception: If encoding an earlier block failed.
+        """
+        if self.error is not None:
+            raise self.error
+
+        # Same conversion as WAVWriter, which also copies the block out of buffers the caller reuses
+        self.blocks.put((block * 32767).astype(np.int16))
+
+    def close(self):
+        """
+        Waits for every queued block to be encoded, then closes the file.
+
+        Raises:
+            Exception: If encoding a block failed.
+        """
+        self.blocks.put(None)
+        self.encoder.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def audioWriter(path, sample_rate=SAMPLE_RATE, length=None, memmap=False, audio_format="wav"):
+    """
+    Opens the incremental writer of an audio format.
+
+    Args:
+        path (str): Path of the file to create.
+        sample_rate (int): Sample rate of the audio.
+        length (int): Number of samples that will be written, required with `memmap`.
+        memmap (bool): Whether to write a WAV into a memory-mapped output file, ignored by compressed formats.
+        audio_format (str): One of `AUDIO_FORMATS`.
+
+    Returns:
+        WAVWriter or EncodedWriter: The writer, to use as a context manager.
+    """
+    if audio_format == "wav":
+        return WAVWriter(path, sample_rate, length, memmap)
+    return EncodedWriter(path, sample_rate, audio_format)
+
+class StageProfiler:
+    def __init__(self, trace_allocations=True):
+        """
+        Collects the wall time and memory allocated by each stage of a render, such as parsing, each instrument
+        and normalization. Stages may nest, and stages of the same name are summed in the printed table.
+
+        Args:
+            trace_allocations (bool): Whether to measure allocations with `tracemalloc`, which slows every
+                allocation a little while profiling.
+        """
+        self.events = []
+        self.open_stages = []
+        self.started = time.perf_counter()
+        self.trace_allocations = trace_allocations
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def tracedMemory(self):
+        """
+        Reads the currently allocated bytes, carrying the peak since the last reading into every open stage.
+
+        Returns:
+            int: Bytes currently allocated, 0 if allocations are not traced.
+        """
+        if not self.trace_allocations:
+            return 0
+
+        current, peak = tracemalloc.get_traced_memory()
+        for stage in self.open_stages:
+            stage["peak"] = max(stage["peak"], peak)
+        tracemalloc.reset_peak()
+        return current
+
+    @contextlib.contextmanager
+    def stage(self, name, notes=None, **details):
+        """
+        Profiles the code run inside a `with` block as one stage.
+
+        Args:
+            name (str): Name of the stage.
+            notes (int): Number of notes the stage renders, for reporting time per note.
+            **details: Additional values to record with the stage in the JSON trace.
+        """
+        memory_before = self.tracedMemory()
+        stage = {"peak": memory_before}
+        self.open_stages.append(stage)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            memory_after = self.tracedMemory()
+            # Stages compare equal by value, remove this one by identity
+            self.open_stages = [open_stage for open_stage in self.open_stages if open_stage is not stage]
+            self.events.append({
+                "name": name,
+                "start": started - self.started,
+                "seconds": seconds,
+                "peak_bytes": stage["peak"] - memory_before,
+                "net_bytes": memory_after - memory_before,
+                "notes": notes,
+                "thread": threading.get_ident(),
+                "details": details,
+            })
+
+    def summary(self):
+        """
+        Sums the profiled stages by name, in the order each stage first finished.
+
+        Returns:
+            List[dict]: Calls, seconds, highest peak and total net bytes allocated, and notes of every stage.
+        """
+        stages = {}
+        for event in self.events:
+            stage = stages.setdefault(event["name"], {"name": event["name"], "calls": 0, "seconds": 0.0,
+                                                      "peak_bytes": 0, "net_bytes": 0, "notes": None})
+            stage["calls"] += 1
+            stage["seconds"] += event["seconds"]
+            stage["peak_bytes"] = max(stage["peak_bytes"], event["peak_bytes"])
+            stage["net_bytes"] += event["net_bytes"]
+            if event["notes"] is not None:
+                stage["notes"] = (stage["notes"] or 0) + event["notes"]
+        return list(stages.values())
+
+    def printTable(self):
+        """
+        Prints the time, share of the total time, allocations and time per note of each profiled stage.
+        """
+        total = max((event["start"] + event["seconds"] for event in self.events), default=0.0) or 1.0
+        print(f"{'Stage':<40} {'Calls':>6} {'Seconds':>9} {'Share':>6} {'Peak MB':>8} {'Net MB':>8} {'Notes':>7} {'us/note':>8}")
+        for stage in self.summary():
+            notes = stage["notes"]
+            per_note = f"{1e6 * stage['seconds'] / notes:8.1f}" if notes else f"{'':>8}"
+            print(f"{stage['name'][:40]:<40} {stage['calls']:>6} {stage['seconds']:>9.3f} {stage['seconds'] / total:>6.1%} "
+                  f"{stage['peak_bytes'] / 1e6:>8.1f} {stage['net_bytes'] / 1e6:>8.1f} "
+                  f"{notes if notes is not None else '':>7} {per_note}")
+
+    def writeTrace(self, trace_path):
+        """
+        Writes every profiled stage as a JSON trace in the Chrome trace event format, viewable in
+        `chrome://tracing` or Perfetto.
+
+        Args:
+            trace_path (str): Path of the JSON file to write.
+        """
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                "name": event["name"],
+                "ph": "X", # Complete event, with a start and duration
+                "ts": 1e6 * event["start"],
+                "dur": 1e6 * event["seconds"],
+                "pid": os.getpid(),
+                "tid": event["thread"],
+                "args": dict(event["details"], peak_bytes=event["peak_bytes"], net_bytes=event["net_bytes"],
+                             notes=event["notes"]),
+            })
+
+        with open(trace_path, 'w') as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+
+class RenderCache:
+    # File extension of cached entries
+    SUFFIX = ".wav"
+
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        """
+        An on-disk cache of rendered chiptune WAVs, addressed by the content of the MIDI and every setting that
+        affects the audio. A hit returns the stored WAV without parsing or synthesizing the MIDI again.
+
+        Args:
+            cache_dir (str): Directory to keep cached WAVs in, created if missing.
+            max_bytes (int): Maximum total size of cached WAVs, least recently used WAVs are evicted beyond it.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, input_midi, disable_adsr, noise_seed=NOISE_SEED, precision="float64", fixed_voices=False):
+        """
+        Hashes a MIDI file's bytes together with the synthesis settings into a render cache key.
+
+        Args:
+            input_midi (str): The MIDI file path to render.
+            disable_adsr (bool): Whether the ADSR envelope is disabled.
+            noise_seed (int): Seed for the noise of percussion sounds.
+            precision (str): Floating point precision the audio is rendered in, one of `PRECISIONS`.
+            fixed_voices (bool): Whether notes are played on the fixed voices of `VOICE_CHANNELS`.
+
+        Returns:
+            str: A hex digest identifying the rendered audio.
+        """
+        hasher = hashlib.sha256()
+        with open(input_midi, 'rb') as midi_file:
+            hasher.update(midi_file.read())
+        hasher.update(synthSettings(disable_adsr, noise_seed, precision, fixed_voices))
+        return hasher.hexdigest()
+
+    def path(self, key):
+        """
+        Args:
+            key (str): A render cache key.
+
+        Returns:
+            str: Path the entry for the key is cached at.
+        """
+        return os.path.join(self.cache_dir, f"{key}{self.SUFFIX}")
+
+    def fetch(self, key, wav_path):
+        """
+        Copies a cached render to the given path if the cache has one for the key.
+
+        Args:
+            key (str): A render cache key.
+            wav_path (str): Path to copy the cached WAV to.
+
+        Returns:
+            bool: Whether the cache had the render.
+        """
+        try:
+            self.markUsed(key)
+            shutil.copyfile(self.path(key), wav_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, wav_path):
+        """
+        Adds a rendered WAV to the cache, then evicts least recently used renders if over the size cap.
+
+        Args:
+            key (str): The render cache key of the WAV.
+            wav_path (str): Path of the rendered WAV to copy into the cache.
+        """
+        with open(wav_path, 'rb') as wav_file:
+            self.writeEntry(key, lambda entry_file: shutil.copyfileobj(wav_file, entry_file))
+
+    def markUsed(self, key):
+        """
+        Marks an entry as recently used, eviction removes the oldest modification times first.
+
+        Args:
+            key (str): The cache key of the entry.
+
+        Raises:
+            FileNotFoundError: If the cache has no entry for the key.
+        """
+        os.utime(self.path(key))
+
+    def writeEntry(self, key, write):
+        """
+        Writes an entry under a temporary name first, so concurrent renders never read a partial entry, then
+        evicts least recently used entries if over the size cap.
+
+        Args:
+            key (str): The cache key of the entry.
+            write (Callable): Writes the entry's contents to the binary file it is given.
+        """
+        temporary_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as entry_file:
+            write(entry_file)
+        os.replace(temporary_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used renders until the cache fits within `max_bytes`.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError: # Already evicted by another converter
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        """
+        Removes every cached render.
+        """
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.SUFFIX) or name.endswith('.tmp'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+class StemCache(RenderCache):
+    # Stems are stored as uncompressed NumPy archives, loading them is a plain read
+    SUFFIX = ".npz"
+
+    def instrumentKey(self, notes: NoteArrays, program, is_drum, disable_adsr, noise_seed=NOISE_SEED, precision="float64",
+                      sample_rate=SAMPLE_RATE):
+        """
+        Hashes an instrument's notes, program and drum flag together with the synthesis settings into a stem
+        cache key. Editing one instrument of a MIDI leaves the keys of every other instrument unchanged.
+
+        Args:
+            notes (NoteArrays): The instrument's notes, from `notesToArrays`.
+            program (int): The instrument's MIDI program number.
+            is_drum (bool): Whether the instrument is a drum kit.
+            disable_adsr (bool): Whether the ADSR envelope is disabled.
+            noise_seed (int): Seed for the noise of percussion sounds.
+            precision (str): Floating point precision the audio is rendered in, one of `PRECISIONS`.
+            sample_rate (int): Sample rate the audio is rendered at.
+
+        Returns:
+            str: A hex digest identifying the instrument's rendered stem.
+        """
+        hasher = hashlib.sha256()
+        for column in (notes.start, notes.length, notes.pitch, notes.velocity):
+            hasher.update(np.ascontiguousarray(column).tobytes())
+        hasher.update(f"{program}:{is_drum}:".encode())
+        hasher.update(synthSettings(disable_adsr, noise_seed, precision, sample_rate=sample_rate))
+        return hasher.hexdigest()
+
+    def load(self, key, track_length):
+        """
+        Reads a cached instrument stem back into full length tracks.
+
+        Args:
+            key (str): The stem cache key of the instrument.
+            track_length (int): Length in samples of the track being rendered.
+
+        Returns:
+            dict: Audio data for each part the instrument contributes to, like `renderInstrument`, or None if
+                the stem is not cached.
+        """
+        try:
+            self.markUsed(key)
+            with np.load(self.path(key)) as stem:
+                parts = {}
+                for part in PARTS:
+                    if part in stem:
+                        parts[part] = np.zeros(track_length, dtype=stem[part].dtype)
+                        start = int(stem[f"{part}_start"])
+                        parts[part][start:start + len(stem[part])] = stem[part]
+        except FileNotFoundError:
+            return None
+        return parts
+
+    def save(self, key, parts):
+        """
+        Adds a rendered instrument stem to the cache, trimmed to the span its parts make sound in, then evicts
+        least recently used stems if over the size cap.
+
+        Args:
+            key (str): The stem cache key of the instrument.
+            parts (dict): Audio data for each part the instrument contributes to, from `renderInstrument`.
+        """
+        arrays = {}
+        for part, wave in parts.items():
+            # Other instruments decide the track length, so only the sounding span is stored
+            sounding = np.flatnonzero(wave)
+            start, end = (sounding[0], sounding[-1] + 1) if len(sounding) else (0, 0)
+            arrays[part] = wave[start:end]
+            arrays[f"{part}_start"] = np.int64(start)
+
+        self.writeEntry(key, lambda stem_file: np.savez(stem_file, **arrays))
+
+class MidiToChiptune:
+    def __init__(self, input_midi, disable_adsr, stream=False, noise_seed=NOISE_SEED, instrument_workers=1, instrument_pool="thread",
+                 stem_cache=None, precision="float64", render=True, profiler=None, fixed_voices=False, sample_rate=None,
+                 draft=False, oscillator=None, segment_workers=1, backend="numpy"):
+        """
+        Extracts the MIDI data from a given `.mid` file to prepare for applying chiptune waveforms on each note.
+
+        Args:
+            input_midi (str): The MIDI file path to process, read with `loadMidi`, or the path of a `.npz` score
+                compiled by `saveScore`, loaded with `loadScore` without parsing. Scores only render at the sample
+                rate they were compiled at.
+            disable_adsr (bool): Whether to apply an ADSR envelope on the melody, bassline, and percussion waves.
+            stream (bool): Whether to skip synthesizing the full track up front, leaving it to `renderBlocks` to
+                render block by block. Full length waveforms are then never allocated.
+            noise_seed (int): Seed for the noise of percussion sounds. The same seed gives the same audio.
+            instrument_workers (int): Number of instruments to render concurrently, 1 renders them one by one.
+            instrument_pool (str): "thread" or "process", the kind of pool to render instruments on concurrently.
+            stem_cache (StemCache): Cache of rendered instrument stems, so only instruments whose notes changed
+                since an earlier render are synthesized again. None renders every instrument.
+            precision (str): Floating point precision of every audio buffer, one of `PRECISIONS`. "float32"
+                halves memory use for long tracks.
+            render (bool): Whether to synthesize the track right away. Without, call `midiToChiptune` (or its
+                `synthesizeParts` and `mixdown` stages) later, e.g. to time parsing and synthesis separately.
+            profiler (StageProfiler): Profiler to record the time and allocations of every stage of the render
+                with, or None to not profile.
+            fixed_voices (bool): Whether to play the notes on the fixed voices of `VOICE_CHANNELS` like an NES,
+                cutting notes short when their channel runs out of voices. Caps how many notes sound at once,
+                so render time grows with song length rather than how densely notes overlap.
+            sample_rate (int): Sample rate to render at, or None for `SAMPLE_RATE` (`DRAFT_SAMPLE_RATE` for drafts).
+            draft (bool): Whether to render a quick, lower quality preview. Drafts render at `DRAFT_SAMPLE_RATE`
+                and skip the melody and bass envelopes, keeping only the percussion envelope that shapes each hit.
+                Their track name is marked "(draft)", so saved drafts are never mistaken for final renders, and
+                they never use the stem cache.
+            oscillator (WavetableOscillator): Oscillator to render with, such as one a long-running process keeps
+                warm between renders, or None to build one. Must match the noise seed, precision and sample rate.
+            segment_workers (int): Number of processes to render the song on by cutting its timeline into segments,
+                1 renders it in this process. Unlike `instrument_workers`, speeds up songs with one dense
+                instrument. Sharded renders skip the stem cache.
+            backend (str): Backend to synthesize melody and bass notes with, one of `BACKENDS`. Falls back to
+                "numpy" when Numba is not installed. Backends differ only by floating point rounding.
+        """
+        # Arguments from Command Line
+        self.input_midi = input_midi
+        self.file_path, file_extension = os.path.splitext(input_midi)
+        self.track_name = os.path.basename(self.file_path)
+        if draft and not self.track_name.endswith(" (draft)"): # Draft scores are already named as drafts
+            self.track_name += " (draft)"
+        self.adsr = not disable_adsr
+        self.stream = stream
+        self.noise_seed = noise_seed
+        self.instrument_workers = instrument_workers
+        self.instrument_pool = instrument_pool
+        self.segment_workers = segment_workers
+        self.stem_cache = None if draft else stem_cache
+        self.stem_hits = 0
+        self.precision = precision
+        self.dtype = np.dtype(precision)
+        self.profiler = profiler
+        self.fixed_voices = fixed_voices
+        self.draft = draft
+        self.sample_rate = sample_rate or (DRAFT_SAMPLE_RATE if draft else SAMPLE_RATE)
+        self.oscillator = oscillator or WavetableOscillator(noise_seed=noise_seed, dtype=self.dtype, sample_rate=self.sample_rate)
+
+        # Melody and bass notes go through the compiled kernel when Numba is available
+        self.kernel = numbaKernel() if backend == "numba" else None
+        if backend == "numba" and self.kernel is None:
+            print("Numba is not installed, falling back to the NumPy backend.")
+        self.backend = "numba" if self.kernel else "numpy"
+
+        # Wrap the drum renderer per instance, cached bodies depend on the ADSR setting and precision
+        self.renderDrum = functools.lru_cache(maxsize=DRUM_CACHE_SIZE)(self._renderDrum)
+        
+        if file_extension not in ('.mid', '.npz'):
+            raise OSError('File must be a MIDI file (.mid) or compiled score (.npz)')
+
+        # Read the notes of every instrument straight into arrays, compiled scores are already in samples
+        if file_extension == '.npz':
+            with self.profileStage("load score"):
+                self.data = loadScore(input_midi)
+            if self.data.sample_rate != self.sample_rate:
+                raise ValueError(f"Score was compiled at {self.data.sample_rate} Hz, compile it again to render at {self.sample_rate} Hz.")
+        else:
+            with self.profileStage("parse MIDI"):
+                self.data = loadMidi(input_midi)
+        self.instruments: List[MidiInstrument] = self.data.instruments # Contains notes under each
+        if fixed_voices:
+            with self.profileStage("allocate voices"):
+                self.instruments = self.allocateVoices()
+        self.time_signatures = self.data.time_signatures
+        self.key_signatures = self.data.key_signatures
+        if isinstance(self.data, Score):
+            self.track_length = self.data.track_length
+        else:
+            with self.profileStage("calculate track length"):
+                self.track_length = self.calculateTrackLength()
+
+        # Streamed tracks are synthesized by renderBlocks as they are consumed
+        self.chiptune_wave = None
+        self.peak = None # Peak amplitude the parts are normalized by, set with chiptune_wave
+        self.note_indexes = None # Built by the first range render
+        if stream or not render:
+            return
+
+        # Perform the chiptune synthesis, storing result in chiptune_wave
+        self.midiToChiptune()
+    
+    def profileStage(self, name, **details):
+        """
+        Starts profiling a stage of the render with the synthesizer's profiler, if it has one.
+
+        Args:
+            name (str): Name of the stage.
+            **details: Values to record with the stage, see `StageProfiler.stage`.
+
+        Returns:
+            ContextManager: The stage to run the profiled code in, or `NO_PROFILE` when not profiling.
+        """
+        if self.profiler is None:
+            return NO_PROFILE
+        return self.profiler.stage(name, **details)
+
+    def calculateTrackLength(self):
+        """
+        Calculates the total duration of the input MIDI track in samples. Necessary for constructing the
+        chiptune waveform arrays so that waves can be placed between where a given note starts and ends.
+
+        Returns:
+            int: The highest end time of a note among all instruments multiplied by the sample rate,
+            indicating total duration.
+        
+        Raises:
+            Exception: If there are no instruments, there is no note data and thus nothing to calculate length for.
+        """
+        if self.instruments:
+            max_end_time = max(np.max(instrument.end) for instrument in self.instruments)
+            return int(max_end_time * self.sample_rate)
+
+        raise Exception("Input MIDI has no instruments and thus no note data.")
+    
+    def midiNoteToFrequency(self, midi_note):
+        """
+        Converts a MIDI note number to its corresponding frequency value.
+
+        Args:
+            midi_note (int): The pitch from a MIDI note to calculate a frequency from.
+        
+        Returns:
+            float: The corresponding frequency to the MIDI note number.
+        """
+        # Baseline key A4 is represented as MIDI note 69
+        return 440.0 * (2 ** ((midi_note - 69) / 12))
+    
+    def printMidiInfo(self):
+        """
+        Prints all the MIDI information, listing all instruments involved with the number of notes in each.
+        If the MIDI file contained any key or time signatures, also display the number of changes.
+        """
+        print("--------------------")
+        print(self.track_name)
+
+        if self.time_signatures:
+            print(f"{len(self.time_signatures)} time signature change{'s' if len(self.time_signatures) > 1 else ''}")
+        if self.key_signatures:
+            print(f"{len(self.key_signatures)} key signature change{'s' if len(self.key_signatures) > 1 else ''}")
+
+        print('\nInstruments:')
+        for instrument in self.instruments:
+            is_drum = ", is a drum" if instrument.is_drum else ''
+            print(f"{instrument.name} has {len(instrument.pitch)} notes, Program {instrument.program}{is_drum}")
+            # for note in instrument.notes:
+            #     print(note.pitch)
+            #     print(f"{self.midiNoteToFrequency(note.pitch)}")
+        
+        print("--------------------")
+
+    def printCacheStats(self):
+        """
+        Prints the hit rate of the drum hit cache, useful for tuning `DRUM_CACHE_SIZE`, skipped if nothing was
+        looked up in it. Melody and bass notes read the wavetables directly, without a cache. Also prints how
+        many instruments were reused from the stem cache, if one is in use.
+        """
+        if self.stem_cache:
+            print(f"Stem cache: {self.stem_hits} of {len(self.instruments)} instruments reused")
+
+        stats = cacheStats(self.renderDrum)
+        if stats["hits"] + stats["misses"]:
+            print(f"Drum cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+                  f"{stats['size']}/{stats['max_size']} bodies cached")
+    
+    def notesToArrays(self, instrument: MidiInstrument):
+        """
+        Converts an instrument's note times in seconds into the sample positions and synthesis parameters that
+        every note is synthesized with together, using grouped array operations instead of one at a time.
+
+        Args:
+            instrument (MidiInstrument): A MIDI instrument read by `loadMidi`, or a `ScoreInstrument` of a
+                compiled score, which is already in samples.
+
+        Returns:
+            NoteArrays: The start sample, length, pitch, frequency and normalized velocity of every note.
+        """
+        if isinstance(instrument, ScoreInstrument):
+            return NoteArrays(
+                start=instrument.start,
+                length=instrument.end - instrument.start,
+                pitch=instrument.pitch,
+                frequency=instrument.frequency,
+                velocity=(instrument.velocity / 127.0).astype(self.dtype),
+            )
+
+        return NoteArrays(
+            start=(instrument.start * self.sample_rate).astype(np.int64),
+            length=(self.sample_rate * (instrument.end - instrument.start)).astype(np.int64),
+            pitch=instrument.pitch,
+            frequency=self.midiNoteToFrequency(instrument.pitch),
+            # Normalize velocity, MIDI considers 127 the maximum strength a note was hit
+            velocity=(instrument.velocity / 127.0).astype(self.dtype),
+        )
+
+    def envelope(self, offsets, lengths, velocities, tAttack, tDecay, tRelease, sustain_level):
+        """
+        Evaluates ADSR envelopes with velocity dynamics at sample offsets within notes. Vectorized, so the
+        envelopes of many notes of differing lengths are computed in one pass.
+
+        Args:
+            offsets (np.ndarray): Sample positions within each note, counting from the note's first sample.
+            lengths (int or np.ndarray): Length in samples of the note each offset belongs to.
+            velocities (float or np.ndarray): MIDI velocity normalized to 0.0–1.0 of the note each offset belongs to.
+            tAttack (float): Attack time in seconds.
+            tDecay (float): Decay time in seconds.
+            tRelease (float): Release time in seconds.
+            sustain_level (float): Base sustain level (scaled by velocity).
+
+        Returns:
+            np.ndarray: The envelope amplitude at every offset.
+        """
+        # Convert time parameters to sample counts
+        attack_samples = int(tAttack * self.sample_rate)
+        decay_samples = int(tDecay * self.sample_rate)
+        release_samples = int(tRelease * self.sample_rate)
+        sustain_samples = np.maximum(0, lengths - (attack_samples + decay_samples + release_samples))
+
+        # Collapse the sustain stage of every note onto a single sample, so notes of every length read the same
+        # ADSR curve. Offsets past the sustain stage shift back by the sustain length into the release stage.
+        sustain_start = attack_samples + decay_samples
+        held = offsets - sustain_start
+        np.maximum(held, 0, out=held)
+        np.minimum(held, sustain_samples, out=held)
+
+        curve = envelopeCurve(attack_samples, decay_samples, release_samples, sustain_level, self.dtype)
+        shape = curve[offsets - held]
+
+        # Scale sustain level and peak amplitude by velocity
+        return velocities * shape
+
+    def renderNotes(self, group: NoteGroup, track, track_start=0, note_indices=None):
+        """
+        Synthesizes the notes of a note group and scatter-adds them into a track, without looping over notes.
+        Notes are flattened into one run of (note index, sample offset) pairs, processed in groups of roughly
+        `BATCH_SAMPLES` samples so temporary arrays stay bounded on long, dense tracks.
+
+        Args:
+            group (NoteGroup): The notes to render, along with how to synthesize them.
+            track (np.ndarray): The track to add rendered notes into, in place. Notes are cut at the track's end.
+            track_start (int): Sample of the song that the first sample of `track` holds, for rendering a block
+                of the song. Only the part of each note that falls inside the block is synthesized.
+            note_indices (np.ndarray): Indices of the notes of the group to render, or None to render them all.
+        """
+        notes = group.notes
+        if note_indices is None:
+            note_indices = np.arange(len(notes.start))
+
+        # Drum hits repeat a few sounds over and over, copied from cached bodies instead
+        if group.part == "percussion":
+            self.renderDrumHits(group, track, track_start, note_indices)
+            return
+        if self.kernel:
+            self.renderNotesFused(group, track, track_start, note_indices)
+            return
+
+        for index, offsets, shifts, low in self.noteBatches(note_indices, notes.start, notes.length, track_start, len(track)):
+            wave = self.synthesizeNotes(group, index, offsets)
+            if self.adsr and not self.draft:
+                with self.profileStage("envelope"):
+                    wave *= self.envelope(offsets, notes.length[index], notes.velocity[index], **ENVELOPES[group.envelope])
+
+            # Place waveforms in the appropriate track timeslot, reusing offsets as positions from the batch's start
+            offsets += shifts
+
+            # Overlapping notes land on the same positions, bincount sums them where a slice-add would not
+            # bincount always sums in float64, only the batch's span is converted back to the track's precision
+            batch_wave = np.bincount(offsets, weights=wave)
+            track[low:low + len(batch_wave)] += batch_wave
+
+    def noteBatches(self, note_indices, starts, lengths, track_start, track_length):
+        """
+        Flattens notes into runs of (note index, sample offset) pairs, one per sample of each note that lands
+        inside a track, split into batches of roughly `BATCH_SAMPLES` samples so temporary arrays stay bounded
+        on long, dense tracks.
+
+        Args:
+            note_indices (np.ndarray): Indices of the notes to render.
+            starts (np.ndarray): Start sample of every note, indexed by `note_indices`.
+            lengths (np.ndarray): Length in samples of every note, indexed by `note_indices`.
+            track_start (int): Sample of the song that the first sample of the track holds.
+            track_length (int): Length of the track in samples. Notes are cut at its end.
+
+        Yields:
+            tuple: For every sample of the batch, the index of its note and its offset within the note, the
+                shift from that offset to its position relative to `low`, and `low`, the track position the
+                batch's samples start at.
+        """
+        # Sort by start so each batch covers a compact stretch of the track
+        order = note_indices[np.argsort(starts[note_indices], kind='stable')]
+        starts = starts[order]
+
+        # Range of samples within each note that lands inside the track
+        firsts = np.maximum(track_start - starts, 0)
+        lengths = np.minimum(track_start + track_length - starts, lengths[order]) - firsts
+        np.maximum(lengths, 0, out=lengths)
+        sample_ends = np.cumsum(lengths)
+
+        # Split notes wherever the running sample count crosses a multiple of BATCH_SAMPLES
+        total_samples = sample_ends[-1] if len(sample_ends) else 0
+        if total_samples == 0:
+            return
+        if total_samples <= BATCH_SAMPLES:
+            bounds = [0, len(order)]
+        else:
+            cuts = np.searchsorted(sample_ends, np.arange(BATCH_SAMPLES, total_samples, BATCH_SAMPLES), side='right')
+            bounds = np.unique(np.concatenate(([0], cuts, [len(order)])))
+
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            batch_lengths = lengths[first:last]
+            flat_firsts = sample_ends[first:last] - batch_lengths
+            base = flat_firsts[0]
+
+            # One entry per rendered sample: which note it belongs to and how far into that note it is
+            index = np.repeat(order[first:last], batch_lengths)
+            offsets = np.arange(sample_ends[last - 1] - base)
+            offsets -= np.repeat(flat_firsts - base - firsts[first:last], batch_lengths)
+
+            low = max(starts[first] - track_start, 0)
+            yield index, offsets, np.repeat(starts[first:last] - track_start - low, batch_lengths), low
+
+    def renderNotesFused(self, group: NoteGroup, track, track_start, note_indices):
+        """
+        Synthesizes the notes of a melody or bass note group straight into a track with the compiled
+        `fusedNotesKernel`, the "numba" backend of `renderNotes`.
+
+        Args:
+            group (NoteGroup): The notes to render, along with how to synthesize them.
+            track (np.ndarray): The track to add rendered notes into, in place. Notes are cut at the track's end.
+            track_start (int): Sample of the song that the first sample of `track` holds.
+            note_indices (np.ndarray): Indices of the notes of the group to render.
+        """
+        notes = group.notes
+        starts = notes.start[note_indices]
+        lengths = notes.length[note_indices]
+
+        # Range of samples within each note that lands inside the track, empty for notes outside it
+        firsts = np.maximum(track_start - starts, 0)
+        lasts = np.minimum(track_start + len(track) - starts, lengths)
+
+        # Same stage lengths as `envelope`
+        settings = ENVELOPES[group.envelope]
+        attack_samples = int(settings["tAttack"] * self.sample_rate)
+        decay_samples = int(settings["tDecay"] * self.sample_rate)
+        release_samples = int(settings["tRelease"] * self.sample_rate)
+        curve = envelopeCurve(attack_samples, decay_samples, release_samples, settings["sustain_level"], self.dtype)
+
+        self.kernel(track, track_start, starts, firsts, lasts, lengths, group.increment[note_indices],
+                    group.volume[note_indices], notes.velocity[note_indices], self.oscillator.tables[group.waveform],
+                    curve, attack_samples + decay_samples, attack_samples + decay_samples + release_samples,
+                    self.adsr and not self.draft)
+
+    def synthesizeNotes(self, group: NoteGroup, index, offsets):
+        """
+        Reads the waves of a note group's notes from the oscillator, before any envelope is applied.
+
+        Args:
+            group (NoteGroup): The notes being rendered.
+            index (np.ndarray): Index of the note each sample belongs to.
+            offsets (np.ndarray): Sample position of each sample within its note.
+
+        Returns:
+            np.ndarray: The wave amplitude at each sample, scaled by the volume of its note.
+        """
+        # Phase accumulator per note, each advancing frequency / sample rate cycles every sample
+        wave = self.oscillator.lookup(group.waveform, offsets * group.increment[index])
+        return group.volume[index] * wave
+
+    def drumLengths(self, lengths, envelope):
+        """
+        Decides which cached body every drum hit is copied from, and how much of it sounds. Hits whose bodies
+        only differ past the end of the shorter one share the longer body, copying just its start.
+
+        Args:
+            lengths (np.ndarray): Length in samples of each hit.
+            envelope (str): Key of the ADSR settings in ENVELOPES the hits are shaped with.
+
+        Returns:
+            tuple: Length of the body each hit is copied from, and number of its samples the hit plays.
+        """
+        if not self.adsr:
+            # A raw wave is the start of any longer one, round lengths up to powers of two to share bodies
+            exponents = np.ceil(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+            return np.left_shift(1, exponents), lengths
+
+        settings = ENVELOPES[envelope]
+        if settings["sustain_level"] == 0:
+            # Without sustain a hit is silent from the end of its decay, and its shape before then is the same
+            # for every length, so every hit is the start of one body
+            audible_samples = int(settings["tAttack"] * self.sample_rate) + int(settings["tDecay"] * self.sample_rate)
+            return np.full_like(lengths, audible_samples), np.minimum(lengths, audible_samples)
+        return lengths, lengths
+
+    def _renderDrum(self, waveform, increment, noise_start, length, envelope):
+        """
+        Renders a drum hit body at unit volume and velocity, with its envelope applied. Use `renderDrum`, the
+        cached wrapper, instead.
+
+        Args:
+            waveform (str): Wavetable the hit reads, or "noise".
+            increment (float): Phase advanced every sample in cycles, for wavetables.
+            noise_start (int): Noise table position the hit starts reading from, for noise.
+            length (int): Length of the body in samples.
+            envelope (str): Key of the ADSR settings in ENVELOPES, applied unless ADSR is disabled.
+
+        Returns:
+            np.ndarray: A read-only array of the rendered hit, shared between cache hits.
+        """
+        offsets = np.arange(length)
+        if waveform == "noise":
+            body = self.oscillator.noise(offsets + noise_start)
+        else:
+            body = self.oscillator.lookup(waveform, offsets * increment)
+
+        if self.adsr:
+            body *= self.envelope(offsets, length, 1.0, **ENVELOPES[envelope])
+
+        # Cached bodies are handed out to every hit, so guard them against in-place edits
+        body.setflags(write=False)
+        return body
+
+    def renderDrumHits(self, group: NoteGroup, track, track_start=0, note_indices=None):
+        """
+        Adds the hits of a percussion note group into a track as scaled copies of cached drum bodies. Drum
+        tracks play a few `DRUM_KEY_MAP` sounds thousands of times, so each distinct body is looked up from
+        `renderDrum` once, then every hit copying it is placed together by `placeDrumHits`.
+
+        Args:
+            group (NoteGroup): The percussion notes to render.
+            track (np.ndarray): The track to add the hits into, in place. Hits are cut at the track's end.
+            track_start (int): Sample of the song that the first sample of `track` holds, see `renderNotes`.
+            note_indices (np.ndarray): Indices of the notes of the group to render, or None to render them all.
+        """
+        notes = group.notes
+        if note_indices is None:
+            note_indices = np.arange(len(notes.start))
+
+        body_lengths, audible = self.drumLengths(notes.length[note_indices], group.envelope)
+
+        # The envelope scales by velocity on top of the volume, which already includes it
+        scales = group.volume[note_indices]
+        if self.adsr:
+            scales = scales * notes.velocity[note_indices]
+
+        # Only hits sounding inside the track need their bodies
+        positions = notes.start[note_indices] - track_start
+        sounding = np.flatnonzero((audible > 0) & (positions < len(track)) & (positions + audible > 0))
+        if not len(sounding):
+            return
+
+        # Sort hits by the body they copy and how much of it they play, then by position
+        keys = np.column_stack((group.increment[note_indices], group.noise_start[note_indices], body_lengths, audible))
+        distinct, kind_of = np.unique(keys[sounding], axis=0, return_inverse=True)
+        kind_of = kind_of.reshape(-1)
+        hits = sounding[np.lexsort((positions[sounding], kind_of))]
+        ends = np.cumsum(np.bincount(kind_of, minlength=len(distinct))).tolist()
+
+        for (increment, noise_start, body_length, length), first, last in zip(distinct.tolist(), [0] + ends[:-1], ends):
+            body = self.renderDrum(group.waveform, increment, int(noise_start), int(body_length), group.envelope)
+            self.placeDrumHits(track, positions[hits[first:last]], body[:int(length)], scales[hits[first:last]])
+
+    def placeDrumHits(self, track, positions, body, scales):
+        """
+        Adds scaled copies of one drum body into a track. Copies are added as rows of a sliding window view of
+        the track, where the window at a hit's position is the span of samples it plays in, so every hit is a
+        contiguous row rather than a scatter of single samples. Rows added at once must not overlap, so hits
+        are dealt into the fewest layers whose hits are at least a body apart. Hits cut by either end of the
+        track are scatter-added sample by sample instead.
+
+        Args:
+            track (np.ndarray): The track to add the hits into, in place.
+            positions (np.ndarray): Position in the track of every hit's first sample, sorted.
+            body (np.ndarray): The samples of the drum body every hit plays.
+            scales (np.ndarray): Amplitude each hit scales the body by.
+        """
+        width = len(body)
+        hit_count = len(positions)
+
+        # Hit i and hit i + layers never overlap once layers covers the most hits starting within one body's span
+        layers = int(np.max(np.searchsorted(positions, positions + width) - np.arange(hit_count)))
+        inside = (positions >= 0) & (positions + width <= len(track))
+        windows = np.lib.stride_tricks.sliding_window_view(track, width, writeable=True) if inside.any() else None
+
+        # Batches reuse the same rows, rather than allocating a fresh array for each
+        batch_hits = min(max(BATCH_SAMPLES // width, 1), hit_count)
+        rows_buffer = np.empty((batch_hits, width), dtype=body.dtype)
+
+        for layer in range(layers):
+            layer_hits = np.arange(layer, hit_count, layers)
+            for batch_start in range(0, len(layer_hits), batch_hits):
+                batch = layer_hits[batch_start:batch_start + batch_hits]
+                rows = np.multiply(scales[batch, None], body, out=rows_buffer[:len(batch)])
+
+                whole = inside[batch]
+                if whole.all():
+                    windows[positions[batch]] += rows
+                    continue
+
+                if whole.any():
+                    windows[positions[batch[whole]]] += rows[whole]
+                spans = positions[batch[~whole], None] + np.arange(width)
+                in_track = (spans >= 0) & (spans < len(track))
+                np.add.at(track, spans[in_track], rows[~whole][in_track])
+
+    def percussionGroups(self, notes: NoteArrays):
+        """
+        Splits the notes of a drum instrument into one note group per drum sound. The type and base volume of 
+        the drum sound depends on a given note's pitch / key number, in addition to whether the note key is 
+        supported in `DRUM_KEY_MAP`.
+
+        Args:
+            notes (NoteArrays): Columnar note data of the drum instrument.
+
+        Returns:
+            List[NoteGroup]: A note group per distinct drum sound played by the instrument.
+        """
+        # Determine the drum sound based on pitch, default to a quieter sound for unsupported drum types
+        drum_configs = [DRUM_KEY_MAP.get(pitch, UNSUPPORTED_DRUM) for pitch in notes.pitch]
+        volumes = notes.velocity * np.array([config["base_volume"] for config in drum_configs], dtype=self.dtype)
+        frequencies = np.array([config.get("frequency", 0.0) for config in drum_configs])
+
+        # For bass drums, sine waves in sub 100Hz range simulate the low-pitched thump of a kick drum
+        # https://www.musicguymixing.com/sine-wave-kick-drum/
+        # Other drums (snares, hi-hats and unsupported drums) simulate short bursts of noise
+        sounds = np.array([config.get("waveform", "noise") for config in drum_configs])
+
+        # Each drum key reads the noise table from its own few offsets, picking one per hit by a multiplicative
+        # hash of its start. Wavetable drums read no noise, so their bodies are shared by every hit.
+        variant = ((notes.start * 2654435761) >> 16) % DRUM_VARIANTS
+        noise_start = (notes.pitch * 40503 + variant * 2654435761) & (NOISE_TABLE_SIZE - 1)
+        noise_start[sounds != "noise"] = 0
+
+        groups = []
+        for sound in np.unique(sounds):
+            is_sound = sounds == sound
+            groups.append(NoteGroup(
+                part="percussion",
+                waveform=str(sound),
+                # Percussion sounds naturally short, should not sustain a sound
+                envelope="percussion",
+                notes=NoteArrays(*(column[is_sound] for column in notes)),
+                volume=volumes[is_sound],
+                increment=frequencies[is_sound] / self.sample_rate,
+                noise_start=noise_start[is_sound],
+            ))
+        return groups
+
+    def programWaveform(self, program):
+        """
+        Chooses the basic waveform to synthesize an instrument with, based on its General MIDI program number.
+        Program numbers: https://en.wikipedia.org/wiki/General_MIDI#Program_change_events
+
+        Args:
+            program (int): The program number of the MIDI instrument.
+
+        Returns:
+            str: "triangle" for bass instruments, "sawtooth" for orchestral instruments, otherwise "square".
+        """
+        if program in range(32, 40): # Bass instruments from 33-40, -1 to account for zero indexing 
+            # Triangle waves softer, fit for bassline: https://soundation.com/music-genres/how-to-make-chiptunes
+            return "triangle"
+        elif program in range(40, 80): # Strings, Ensemble, Brass, Reed, and Pipe labeled 41-80, -1 for zero indexing
+            # Sawtooth best for bowed instruments: https://en.wikipedia.org/wiki/Sawtooth_wave
+            return "sawtooth"
+        # All other instruments used for melody (piano, etc.)
+        return "square" # Square waves make sharp distinct sounds fitting for a melody
+
+    def melodyOrBasslineGroup(self, notes: NoteArrays, program):
+        """
+        Wraps the notes of a melodic instrument into a note group, as either melody or bassline depending on 
+        the instrument's program number.
+
+        Args:
+            notes (NoteArrays): Columnar note data of the instrument.
+            program (int): The program number of the MIDI instrument.
+
+        Returns:
+            NoteGroup: The notes of the instrument with the waveform and part its program maps to.
+        """
+        waveform = self.programWaveform(program)
+        part = "bass" if waveform == "triangle" else "melody"
+
+        return NoteGroup(
+            part=part,
+            waveform=waveform,
+            envelope=part,
+            notes=notes,
+            volume=notes.velocity,
+            increment=notes.frequency / self.sample_rate,
+            noise_start=None,
+        )
+
+    def instrumentGroups(self, instrument: MidiInstrument):
+        """
+        Converts a MIDI instrument's notes into the note groups to render it with.
+
+        Args:
+            instrument (MidiInstrument): A MIDI instrument read by `loadMidi`.
+
+        Returns:
+            List[NoteGroup]: Note groups covering every note of the instrument.
+        """
+        notes = self.notesToArrays(instrument)
+        if instrument.is_drum:
+            # Drums don't use frequency / note pitch, generate a percussive noise based on note pitch
+            return self.percussionGroups(notes)
+        return [self.melodyOrBasslineGroup(notes, instrument.program)]
+
+    def voiceChannel(self, instrument: MidiInstrument):
+        """
+        Chooses the `VOICE_CHANNELS` channel an instrument plays on in fixed voice mode, following the same
+        program number mapping as `programWaveform`.
+
+        Args:
+            instrument (MidiInstrument): A MIDI instrument read by `loadMidi`.
+
+        Returns:
+            str: "noise" for drums, "triangle" for bass instruments, otherwise "pulse".
+        """
+        if instrument.is_drum:
+            return "noise"
+        return "triangle" if self.programWaveform(instrument.program) == "triangle" else "pulse"
+
+    def allocateVoices(self):
+        """
+        Plays every note on the fixed voices of `VOICE_CHANNELS`, shared by all instruments on a channel, the way
+        an NES sound driver would. A note takes a free voice of its channel. When none is free it steals the voice
+        of the note that started earliest, ending that note where the new one starts. Notes starting together
+        are allocated lowest priority first, so the highest pitch keeps the pulse voices, the lowest pitch the
+        triangle and the loudest drum of `DRUM_KEY_MAP` the noise channel.
+
+        Returns:
+            List[MidiInstrument]: The instruments, with the end of every stolen note moved to when it was stolen.
+        """
+        channels = [self.voiceChannel(instrument) for instrument in self.instruments]
+        ends = [instrument.end.copy() for instrument in self.instruments]
+
+        for channel, voices in VOICE_CHANNELS.items():
+            members = [index for index, instrument_channel in enumerate(channels) if instrument_channel == channel]
+            if not members:
+                continue
+
+            # Flatten the channel's notes across its instruments, remembering where each came from
+            starts = np.concatenate([self.instruments[index].start for index in members])
+            note_ends = np.concatenate([ends[index] for index in members])
+            pitches = np.concatenate([self.instruments[index].pitch for index in members])
+            if channel == "noise":
+                priority = np.array([DRUM_KEY_MAP.get(pitch, UNSUPPORTED_DRUM)["base_volume"] for pitch in pitches.tolist()])
+            else:
+                priority = pitches if channel == "pulse" else -pitches
+
+            # Notes in the order they take a voice, lowest priority first among notes starting together
+            order = np.lexsort((priority, starts))
+            start_times = starts.tolist()
+            end_times = note_ends.tolist()
+            playing = [] # Notes holding a voice, earliest started first
+            for note in order.tolist():
+                start = start_times[note]
+                playing = [other for other in playing if end_times[other] > start]
+                if len(playing) == voices:
+                    end_times[playing.pop(0)] = start
+                playing.append(note)
+
+            note_ends = np.array(end_times)
+            offset = 0
+            for index in members:
+                count = len(ends[index])
+                ends[index] = note_ends[offset:offset + count]
+                offset += count
+
+        return [instrument._replace(end=end) for instrument, end in zip(self.instruments, ends)]
+
+    def renderInstrument(self, index):
         """
-        Extracts the MIDI data from a given `.mid` file to prepare for applying chiptune waveforms on each note.
+        Renders every note of a MIDI instrument into full length tracks for the parts it plays. Instruments
+        are independent until they are summed, so this can run for several instruments concurrently.
 
         Args:
-            input_midi (str): The MIDI file path to process, parsed using the `pretty_midi` library.
-            disable_adsr (bool): Whether to apply an ADSR envelope on the melody, bassline, and percussion waves.
+            index (int): Index of the instrument in `instruments`. Instruments are passed by index, as ones
+                sharing a name and program can only be told apart by their position.
+
+        Returns:
+            dict: Audio data for each part ("melody", "bass" or "percussion") the instrument contributes to.
         """
-        # Arguments from Command Line
-        self.file_path, file_extension = os.path.splitext(input_midi)
-        self.track_name = os.path.basename(self.file_path)
-        self.adsr = not disable_adsr
-        
-        if not file_extension == '.mid':
-            raise OSError('File must be a MIDI file (.mid)')
-        
-        # Get all the information pretty_midi parses
-        self.data = pretty_midi.PrettyMIDI(input_midi)
-        self.instruments: List[pretty_midi.Instrument] = self.data.instruments # Contains notes under each
-        self.time_signatures = self.data.time_signature_changes
-        self.key_signatures = self.data.key_signature_changes
-        self.track_length = self.calculateTrackLength()
+        instrument = self.instruments[index]
+        parts = {}
+        stage = NO_PROFILE
+        if self.profiler:
+            drums = ", drums" if instrument.is_drum else ""
+            stage = self.profileStage(f"instrument {index}: {instrument.name.strip() or 'unnamed'} ({instrument.program}{drums})",
+                                      notes=len(instrument.pitch), program=instrument.program, is_drum=instrument.is_drum)
 
-        # Waveforms to construct chiptune tunes with
-        self.melody_wave = np.zeros(self.track_length)
-        self.bass_wave = np.zeros(self.track_length)
-        self.percussion_wave = np.zeros(self.track_length)
+        with stage:
+            for group in self.instrumentGroups(instrument):
+                if group.part not in parts:
+                    parts[group.part] = np.zeros(self.track_length, dtype=self.dtype)
+                self.renderNotes(group, parts[group.part])
 
-        # Final wave to sum above musical parts into
-        self.chiptune_wave = np.zeros(self.track_length)
+        # Contains chiptune audio data for the melody, bassline or percussion of this instrument
+        return parts
 
-        # Perform the chiptune synthesis, storing result in chiptune_wave
-        self.midiToChiptune()
-    
-    def calculateTrackLength(self):
+    def normalize(self, wave, peak):
         """
-        Calculates the total duration of the input MIDI track in samples. Necessary for constructing the
-        chiptune waveform arrays so that waves can be placed between where a given note starts and ends.
+        Scales synthesized audio into the final output range in place, shared by full and block-based rendering.
+        Working in place keeps a long track from being copied at every step.
+
+        Args:
+            wave (np.ndarray): Summed melody, bassline and percussion audio, overwritten with the result.
+            peak (float): Highest absolute amplitude of the whole summed track.
 
         Returns:
-            int: The highest end time of a note among all instruments multiplied by `SAMPLE_RATE`, 
-            indicating total duration.
-        
-        Raises:
-            Exception: If there are no instruments, there is no note data and thus nothing to calculate length for.
+            np.ndarray: `wave`, now normalized, softly limited and scaled by `LOUDNESS`.
         """
-        if self.instruments:
-            max_end_time = max(max(note.end for note in instrument.notes) for instrument in self.instruments)
-            return int(max_end_time * SAMPLE_RATE)
+        # Due to additive synthesis (overlaying waves on top of each other), normalize to prevent clipping.
+        # A peak of 0 means the audio is silent, any divisor works.
+        wave /= peak or 1.0
+        np.tanh(wave, out=wave) # Softly limit range to prevent peaks
+        wave *= LOUDNESS
+        return wave
 
-        raise Exception("Input MIDI has no instruments and thus no note data.")
-    
-    def midiNoteToFrequency(self, midi_note):
+    def peakAmplitude(self, wave):
         """
-        Converts a MIDI note number to its corresponding frequency value.
+        Finds the highest absolute amplitude of audio, without allocating an `np.abs` copy of it.
 
         Args:
-            midi_note (int): The pitch from a MIDI note to calculate a frequency from.
-        
+            wave (np.ndarray): Audio data.
+
         Returns:
-            float: The corresponding frequency to the MIDI note number.
+            float: The peak amplitude, equal to `np.max(np.abs(wave))`.
         """
-        # Baseline key A4 is represented as MIDI note 69
-        return 440.0 * (2 ** ((midi_note - 69) / 12))
-    
-    def printMidiInfo(self):
+        return float(max(np.max(wave), -np.min(wave)))
+
+    def midiToChiptune(self):
         """
-        Prints all the MIDI information, listing all instruments involved with the number of notes in each.
-        If the MIDI file contained any key or time signatures, also display the number of changes.
+        The process to generate a chiptune track for an input MIDI file. For every instrument from the MIDI, 
+        populates melody, bassline, and percussion tracks with basic waveforms based on each note's pitch, velocity, 
+        and duration. Then, combines each part to construct the complete chiptune wave resembling the input MIDI.
+        
+        Populates the `melody_wave`, `bass_wave` and `percussion_wave` class variables to sum into the overall 
+        `chiptune_wave`, the final synthesized audio data. Instruments are rendered on a pool when 
+        `instrument_workers` is above 1, with output identical to rendering them one by one. With a stem cache,
+        unchanged instruments are loaded instead of rendered, leaving only mixing and normalization.
+        """        
+        self.synthesizeParts()
+        self.mixdown()
+
+    def synthesizeParts(self):
         """
-        print("--------------------")
-        print(self.track_name)
+        The synthesis stage of `midiToChiptune`, rendering every instrument into the `melody_wave`, `bass_wave`
+        and `percussion_wave` tracks.
+        """
+        with self.profileStage("synthesis", notes=sum(len(instrument.pitch) for instrument in self.instruments)):
+            # Waveforms to construct chiptune tunes with, summed into the final `chiptune_wave`
+            self.melody_wave = np.zeros(self.track_length, dtype=self.dtype)
+            self.bass_wave = np.zeros(self.track_length, dtype=self.dtype)
+            self.percussion_wave = np.zeros(self.track_length, dtype=self.dtype)
 
-        if self.time_signatures:
-            print(f"{len(self.time_signatures)} time signature change{'s' if len(self.time_signatures) > 1 else ''}")
-        if self.key_signatures:
-            print(f"{len(self.key_signatures)} key signature change{'s' if len(self.key_signatures) > 1 else ''}")
+            if self.segment_workers > 1:
+                self.renderSegments()
+            else:
+                self.mixInstruments(self.instrumentParts())
 
-        print('\nInstruments:')
-        for instrument in self.instruments:
-            is_drum = ", is a drum" if instrument.is_drum else ''
-            print(f"{instrument.name} has {len(instrument.notes)} notes, Program {instrument.program}{is_drum}")
-            # for note in instrument.notes:
-            #     print(note.pitch)
-            #     print(f"{self.midiNoteToFrequency(note.pitch)}")
-        
-        print("--------------------")
-    
-    def applyEnvelope(self, original_wave, tAttack, tDecay, tRelease, sustain_level, velocity):
+    def mixdown(self):
+        """
+        The normalization stage of `midiToChiptune`, summing the synthesized parts into `chiptune_wave`.
         """
-        Applies an ADSR envelope to a waveform with velocity dynamics.
+        # Construct final wave, combine all instruments back together. Sum and normalize in place, only
+        # allocating the final wave once.
+        with self.profileStage("normalize"):
+            self.chiptune_wave = self.melody_wave + self.bass_wave
+            self.chiptune_wave += self.percussion_wave
+            self.peak = self.peakAmplitude(self.chiptune_wave)
+            self.normalize(self.chiptune_wave, self.peak)
+
+    def renderInstruments(self, indices):
+        """
+        Renders the given instruments, on a thread or process pool when `instrument_workers` is above 1.
 
         Args:
-            original_wave (np.ndarray): The waveform to apply the envelope to.
-            tAttack (float): Attack time in seconds.
-            tDecay (float): Decay time in seconds.
-            tRelease (float): Release time in seconds.
-            sustain_level (float): Base sustain level (scaled by velocity).
-            velocity (float): MIDI velocity normalized to 0.0–1.0.
+            indices (List[int]): Indices of the instruments to render.
 
         Returns:
-            np.ndarray: A copy of the original waveform with the ADSR envelope applied.
+            Iterator[dict]: Output of `renderInstrument` for each instrument, in the order of `indices`.
         """
-        wave = np.copy(original_wave)
+        if self.instrument_workers > 1 and self.instrument_pool == "process":
+            # Workers parse the MIDI themselves once, so only instrument indices and rendered parts are sent
+            with ProcessPoolExecutor(self.instrument_workers, initializer=initInstrumentWorker,
+                                     initargs=(self.input_midi, not self.adsr, self.noise_seed, self.precision, self.fixed_voices,
+                                               self.sample_rate, self.draft, self.backend)) as pool:
+                yield from pool.map(renderInstrumentWorker, indices)
 
-        # Convert time parameters to sample counts
-        attack_samples = int(tAttack * SAMPLE_RATE)
-        decay_samples = int(tDecay * SAMPLE_RATE)
-        release_samples = int(tRelease * SAMPLE_RATE)
-        sustain_samples = max(0, len(wave) - (attack_samples + decay_samples + release_samples))
+        elif self.instrument_workers > 1:
+            # NumPy releases the GIL during most array operations, so threads render instruments in parallel
+            with ThreadPoolExecutor(self.instrument_workers) as pool:
+                yield from pool.map(self.renderInstrument, indices)
 
-        # Scale sustain level and peak amplitude by velocity
-        peak_amplitude = velocity
-        scaled_sustain = sustain_level * velocity
-
-        envelope = np.concatenate([
-            np.linspace(0, peak_amplitude, attack_samples), # Attack
-            np.linspace(peak_amplitude, scaled_sustain, decay_samples), # Decay
-            np.full(sustain_samples, scaled_sustain), # Sustain
-            np.linspace(scaled_sustain, 0, release_samples) # Release
-        ])
-
-        # Apply envelope to wave, ensure envelope matches wave length in case of int rounding
-        return wave * envelope[:len(wave)]
-    
-    def generateWave(self, frequency, duration, waveform='square', volume=0.5):
-        """
-        Generates a waveform of the specified type for a given frequency. This generation imitates the
-        chiptune effect by synthesizing a basic waveform using a note's pitch from the input MIDI.
+        else:
+            yield from (self.renderInstrument(index) for index in indices)
 
-        Args:
-            frequency (float): Frequency (Hz) of a note pitch to generate a waveform with.
-            duration (float): Duration of the waveform in seconds. Determined by the note's start and end times.
-            waveform (str): The type of basic waveform to generate for a chiptune effect.
-            volume (float): Volume scaling factor (0.0 to 1.0).
+    def instrumentParts(self):
+        """
+        Produces the rendered parts of every instrument in MIDI order, loading unchanged instruments from the
+        stem cache and rendering the rest, which are then stored for the next render.
 
         Returns:
-            np.ndarray: The generated waveform as a numpy array.
+            Iterator[dict]: Audio data for each part of each instrument, like `renderInstrument`.
+        """
+        if not self.stem_cache:
+            yield from self.renderInstruments(range(len(self.instruments)))
+            return
 
-        Raises:
-            Exception: If the specified waveform type is unsupported.
+        keys = [self.stem_cache.instrumentKey(self.notesToArrays(instrument), instrument.program,
+                                              instrument.is_drum, not self.adsr, self.noise_seed, self.precision, self.sample_rate)
+                for instrument in self.instruments]
+        missing = [index for index, key in enumerate(keys) if not os.path.exists(self.stem_cache.path(key))]
+        rendered = self.renderInstruments(missing)
+        missing = set(missing)
+
+        for index, key in enumerate(keys):
+            parts = None if index in missing else self.stem_cache.load(key, self.track_length)
+            if parts is not None:
+                self.stem_hits += 1
+            elif index in missing:
+                parts = next(rendered)
+                self.stem_cache.save(key, parts)
+            else: # Evicted since it was checked for
+                parts = self.renderInstrument(index)
+                self.stem_cache.save(key, parts)
+            yield parts
+
+    def renderSegments(self):
         """
-        time = np.linspace(0, duration, int(SAMPLE_RATE * duration), endpoint=False)
+        Renders the song sharded by time: the timeline is cut into `SEGMENTS_PER_WORKER` segments per worker,
+        and worker processes render each segment with `renderWindow` from only the notes overlapping it, including
+        the tails of notes that began in earlier segments. Every sample lies in exactly one segment and notes are
+        synthesized from their own start wherever they are cut, so seams are sample-exact. Segments are copied
+        into the `melody_wave`, `bass_wave` and `percussion_wave` tracks, and normalized globally by `mixdown`.
+        Workers only send back the parts sounding in their segment, the rest of each track stays silent.
+        """
+        bounds = np.unique(np.linspace(0, self.track_length, self.segment_workers * SEGMENTS_PER_WORKER + 1).astype(np.int64))
+        waves = {"melody": self.melody_wave, "bass": self.bass_wave, "percussion": self.percussion_wave}
 
-        if waveform == 'square':
-            # Defined as sign function of sinusoid: https://en.wikipedia.org/wiki/Square_wave
-            return volume * np.sign(np.sin(2 * np.pi * frequency * time)) 
-        
-        elif waveform == 'sawtooth':
-            return volume * signal.sawtooth(2 * np.pi * frequency * time)
-        
-        elif waveform == 'triangle':
-            # Width of 0.5 gives a a triangle wave:
-            # https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.sawtooth.html
-            return volume * signal.sawtooth(2 * np.pi * frequency * time, width=0.5) 
-        
-        elif waveform == 'sine':
-            return volume * np.sin(2 * np.pi * frequency * time)
+        # Workers parse the MIDI and index its notes once, so only segment bounds and rendered audio are sent
+        with ProcessPoolExecutor(self.segment_workers, initializer=initInstrumentWorker,
+                                 initargs=(self.input_midi, not self.adsr, self.noise_seed, self.precision, self.fixed_voices,
+                                           self.sample_rate, self.draft, self.backend)) as pool:
+            for start, end, parts in zip(bounds[:-1], bounds[1:], pool.map(renderSegmentWorker, bounds[:-1], bounds[1:])):
+                for part, wave in parts.items():
+                    waves[part][start:end] = wave
 
-        raise Exception(f"{waveform} is not a supported waveform to generate.")
-    
-    def generateNoise(self, duration, volume):
+    def mixInstruments(self, instrument_parts):
         """
-        Generates white noise for percussion sounds.
-        
+        Sums rendered instruments into the `melody_wave`, `bass_wave` and `percussion_wave` tracks. Instruments
+        are summed in MIDI order, however they were rendered, so floating point sums match the serial path.
+
         Args:
-            duration (float): Duration to play the noise in seconds.
-            volume (float): Volume to scale noise (0 to 1).
+            instrument_parts (Iterable[dict]): Output of `renderInstrument` for each instrument, in MIDI order.
         """
-        # Random values to simulate noise, stay within -1 to 1 amplitude to align with normalization
-        return volume * np.random.uniform(-1, 1, int(SAMPLE_RATE * duration))
-    
-    def generateDrumSound(self, pitch, duration, velocity):
+        waves = {"melody": self.melody_wave, "bass": self.bass_wave, "percussion": self.percussion_wave}
+        for parts in instrument_parts:
+            for part, wave in parts.items():
+                waves[part] += wave
+
+    def mixBlocks(self, block_size=BLOCK_SIZE):
+        """
+        Renders the melody, bassline and percussion parts of the track one block at a time, before normalization.
+        A `NoteScheduler` hands each block only the notes sounding during it, so memory stays bounded by the 
+        block size and the number of notes playing at once rather than the length of the song.
+
+        Args:
+            block_size (int): Number of samples per block. The final block may be shorter.
+
+        Yields:
+            dict: The "melody", "bass" and "percussion" audio of each consecutive block.
+        """
+        groups = [group for instrument in self.instruments for group in self.instrumentGroups(instrument)]
+        scheduler = NoteScheduler(groups)
+
+        for block_start in range(0, self.track_length, block_size):
+            block_end = min(block_start + block_size, self.track_length)
+            parts = {part: np.zeros(block_end - block_start, dtype=self.dtype) for part in PARTS}
+
+            for group, note_indices in scheduler.activeNotes(block_start, block_end):
+                self.renderNotes(group, parts[group.part], block_start, note_indices)
+
+            yield parts
+
+    def scanPeak(self, block_size=BLOCK_SIZE):
         """
-        Generates a drum effect based on the percussive sound determined by an input note's pitch.
-        References the `DRUM_KEY_MAP` for supported note numbers / drum types.
+        Finds the highest absolute amplitude of the summed track with a first rendering pass over all blocks,
+        so blocks can be normalized exactly like the full track without keeping the whole song in memory.
 
         Args:
-            pitch (int): The MIDI note pitch to determine which type of drum sound is generated.
-            duration (float): Duration of the input note in seconds. 
-            velocity (int): The strength the input note, used to determine volume multiplier.
+            block_size (int): Number of samples per block.
 
         Returns:
-            wave (np.ndarray): A sine wave or noise wave array to use as the drum sound for the notes 
-            of a percussion instrument.
+            float: The peak amplitude of the track before normalization.
         """
-        # Determine the drum sound based on pitch, default to a quieter sound for unsupported drum types
-        drum_config = DRUM_KEY_MAP.get(pitch, {"type": "unsupported", "base_volume": 0.3})
-        volume = velocity * drum_config["base_volume"]
+        peak = 0.0
+        for parts in self.mixBlocks(block_size):
+            block = parts["melody"] + parts["bass"] + parts["percussion"]
+            peak = max(peak, self.peakAmplitude(block))
+        return peak
 
-        # For bass drums, sine waves in sub 100Hz range simulate the low-pitched thump of a kick drum
-        # https://www.musicguymixing.com/sine-wave-kick-drum/
-        if drum_config["type"] == "wave":
-            wave = self.generateWave(drum_config["frequency"], duration, drum_config["waveform"], volume)
-        else:
-            # Simulate the short bursts of noise-based drum sounds. Unsupported drum pitches sound quieter.
-            wave = self.generateNoise(duration, volume)
-        
-        return wave
-    
-    def generatePercussion(self, notes: List[pretty_midi.Note]):
+    def renderBlocks(self, block_size=BLOCK_SIZE, lookahead=None):
         """
-        Given all notes from an instrument in the input MIDI, generates a percussion waveform or noise wave.
-        The type and base volume of the drum sound to generate depends on the a given note's pitch / key number, 
-        in addition to whether the note key is supported in `DRUM_KEY_MAP`.
+        Streams the final chiptune track as consecutive blocks, equivalent to `chiptune_wave` but without ever
+        holding the whole song. By default uses two passes: one to find the peak for normalization, then one 
+        to render.
+
+        With a `lookahead`, renders in a single pass instead. Each block is normalized by the highest peak among
+        the blocks rendered so far plus the next `lookahead` blocks, so the first block is ready after rendering
+        only `lookahead + 1` blocks. The level then drops whenever a louder passage first arrives, so output is
+        only approximately equal to `chiptune_wave`.
 
         Args:
-            notes (List[Note]): Array of notes to derive information from for generating chiptune noises.
-        
+            block_size (int): Number of samples per block. The final block may be shorter.
+            lookahead (int): Number of blocks to look ahead for single pass normalization, or None for two passes.
+
+        Yields:
+            np.ndarray: Normalized chiptune audio for each consecutive block of the track.
+        """
+        if lookahead is None:
+            peak = self.scanPeak(block_size)
+            for parts in self.mixBlocks(block_size):
+                block = parts["melody"] + parts["bass"] + parts["percussion"]
+                yield self.normalize(block, peak)
+            return
+
+        pending = collections.deque()
+        peak = 0.0
+        for parts in self.mixBlocks(block_size):
+            block = parts["melody"] + parts["bass"] + parts["percussion"]
+            peak = max(peak, self.peakAmplitude(block))
+            pending.append(block)
+
+            if len(pending) > lookahead:
+                yield self.normalize(pending.popleft(), peak)
+
+        while pending:
+            yield self.normalize(pending.popleft(), peak)
+
+    def noteIndexes(self):
+        """
+        Builds a `NoteIndex` over every note group of the track on first use, shared by later range renders.
+
         Returns:
-            percussion_parts: Audio data containing the generated percussive waveform or noises.
+            List[tuple]: Each note group with the index of its notes.
         """
-        percussion_parts = np.zeros(self.track_length)
+        if self.note_indexes is None:
+            with self.profileStage("index notes"):
+                groups = [group for instrument in self.instruments for group in self.instrumentGroups(instrument)]
+                self.note_indexes = [(group, NoteIndex(group.notes)) for group in groups]
+        return self.note_indexes
 
-        for note in notes:
-            duration = note.end - note.start
-            velocity = note.velocity / 127.0
-            
-            # Obtain either a waveform (bass drums) or noise wave (other drums).
-            wave = self.generateDrumSound(note.pitch, duration, velocity)
-            if self.adsr:
-                # Percussion sounds naturally short, should not sustain a sound
-                wave = self.applyEnvelope(wave, tAttack=0.01, tDecay=0.05, tRelease=0.05, sustain_level=0.0, velocity=velocity)
+    def renderWindow(self, window_start, window_end):
+        """
+        Renders the parts of a window of the song, before normalization, from the notes the interval index of
+        `noteIndexes` finds overlapping it.
 
-            # Add part to percussion track during its timeslot
-            start_sample = int(note.start * SAMPLE_RATE)
-            end_sample = start_sample + len(wave)
-            
-            percussion_parts[start_sample:end_sample] += wave[:len(percussion_parts) - start_sample]
-        
-        # Contains chiptune audio data for percussive instruments
-        return percussion_parts
+        Args:
+            window_start (int): First sample of the window.
+            window_end (int): Sample after the last sample of the window.
+
+        Returns:
+            dict: Audio data of the window for each part ("melody", "bass" or "percussion") a note sounds in,
+                like `renderInstrument`. Parts silent throughout the window are left out, so segment workers
+                don't allocate and send them.
+        """
+        parts = {}
+        for group, index in self.noteIndexes():
+            note_indices = index.overlapping(window_start, window_end)
+            if len(note_indices):
+                if group.part not in parts:
+                    parts[group.part] = np.zeros(window_end - window_start, dtype=self.dtype)
+                self.renderNotes(group, parts[group.part], window_start, note_indices)
+        return parts
 
-    def generateMelodyOrBassline(self, notes: List[pretty_midi.Note], program):
+    def renderRange(self, start, end=None):
         """
-        Given all notes from an instrument in the input MIDI, generates a basic waveform to serve as the melody
-        or bassline for this instrument of the chiptune synthesis. Whether a melody or bassline is generated depends 
-        on the instrument's program number.
+        Renders only a window of the song into `chiptune_wave`, such as a few bars to preview, including the
+        tails of notes that began before it. Notes are looked up in the interval index of `noteIndexes`, so the
+        time taken depends on the window's length rather than the song's.
+
+        The window is normalized by its own peak, as the peak of the whole song is unknown without rendering it.
+        Quieter passages therefore play louder than in the full render.
 
         Args:
-            notes (List[Note]): Array of notes to derive information from for generating a chiptune wave.
-            program (int): The program number of the MIDI instrument.
-        
+            start (float): Time in seconds the window starts at.
+            end (float): Time in seconds the window ends at, or None for the end of the song.
+
         Returns:
-            tuple (melody_parts, bass_parts): Audio data containing the generated waveform for either the melody 
-            or bassline.
+            np.ndarray: The normalized audio of the window, also stored in `chiptune_wave`. Its parts are stored
+                in `melody_wave`, `bass_wave` and `percussion_wave`, for `saveStems`.
+
+        Raises:
+            ValueError: If the window is empty or starts after the song ends.
         """
-        melody_parts = np.zeros(self.track_length)
-        bass_parts = np.zeros(self.track_length)
+        window_start = int(start * self.sample_rate)
+        window_end = self.track_length if end is None else min(int(end * self.sample_rate), self.track_length)
+        if window_start < 0 or window_start >= window_end:
+            raise ValueError(f"Cannot render {start}s to {end}s of a {self.track_length / self.sample_rate:.2f}s song.")
 
-        # General MIDI Program Numbers: https://en.wikipedia.org/wiki/General_MIDI#Program_change_events
-        waveform = None
-        if program in range(32, 40): # Bass instruments from 33-40, -1 to account for zero indexing 
-            # Triangle waves softer, fit for bassline: https://soundation.com/music-genres/how-to-make-chiptunes
-            waveform = "triangle"
-        elif program in range(40, 80): # Strings, Ensemble, Brass, Reed, and Pipe labeled 41-80, -1 for zero indexing
-            # Sawtooth best for bowed instruments: https://en.wikipedia.org/wiki/Sawtooth_wave
-            waveform = "sawtooth"
-        else: # All other instruments used for melody (piano, etc.)
-            waveform = "square" # Square waves make sharp distinct sounds fitting for a melody
-
-        # Apply waveform on each note played by the instrument
-        for note in notes:
-            frequency = self.midiNoteToFrequency(note.pitch)
-            duration = note.end - note.start
-            # Normalize velocity, MIDI considers 127 the maximum strength a note was hit
-            velocity = note.velocity / 127.0
-
-            # Construct waveform data
-            wave = self.generateWave(frequency, duration, waveform, volume=velocity)
-
-            # Place waveforms in the appropriate track timeslot
-            start_sample = int(note.start * SAMPLE_RATE)
-            end_sample = start_sample + len(wave)
-            
-            if waveform == "triangle": # Bass
-                if self.adsr:
-                    wave = self.applyEnvelope(wave, tAttack=0.01, tDecay=0.1, tRelease=0.1, sustain_level=0.65, velocity=velocity)
-                bass_parts[start_sample:end_sample] += wave[:len(bass_parts) - start_sample]
-
-            else: # Melody (square or sawtooth)
-                if self.adsr:
-                    wave = self.applyEnvelope(wave, tAttack=0.05, tDecay=0.15, tRelease=0.2, sustain_level=0.75, velocity=velocity)
-                melody_parts[start_sample:end_sample] += wave[:len(melody_parts) - start_sample]
-        
-        # Contains chiptune audio data for melody and bassline instruments
-        return melody_parts, bass_parts
+        self.noteIndexes()
+        with self.profileStage("render range"):
+            parts = self.renderWindow(window_start, window_end)
 
-    def midiToChiptune(self):
+        # Sum and normalize like mixdown, so the window matches the full render up to its level
+        for part in PARTS:
+            if part not in parts:
+                parts[part] = np.zeros(window_end - window_start, dtype=self.dtype)
+        self.melody_wave, self.bass_wave, self.percussion_wave = parts["melody"], parts["bass"], parts["percussion"]
+        self.mixdown()
+        return self.chiptune_wave
+
+    def saveScore(self, output_dir="output-wavs"):
         """
-        The process to generate a chiptune track for an input MIDI file. For every instrument from the MIDI, 
-        populates melody, bassline, and percussion tracks with basic waveforms based on each note's pitch, velocity, 
-        and duration. Then, combines each part to construct the complete chiptune wave resembling the input MIDI.
-        
-        Populates the `melody_wave`, `bass_wave` and `percussion_wave` class variables to sum into the overall 
-        `chiptune_wave`, the final synthesized audio data.
-        """        
-        for instrument in self.instruments:
-             if instrument.is_drum:
-                # Drums don't use frequency / note pitch, generate a percussive noise based on note pitch
-                self.percussion_wave += self.generatePercussion(instrument.notes)
-             else:
-                # Melodic and bassline notes, determine which part based on MIDI program
-                melody_parts, bass_parts = self.generateMelodyOrBassline(instrument.notes, instrument.program)
-                self.melody_wave += melody_parts
-                self.bass_wave += bass_parts
-        
-        # Construct final wave, combine all instruments back together
-        self.chiptune_wave = self.melody_wave + self.bass_wave + self.percussion_wave
+        Compiles the MIDI into a columnar score, saved as `{track name}.npz`. The notes of every instrument are
+        converted to start and end samples at the synthesizer's sample rate, with their frequency, velocity,
+        program and drum flag, so rendering the score skips parsing, track length and frequency calculations.
+        Synthesis settings such as the ADSR envelope, precision or fixed voices are chosen when rendering, so
+        one score can be rendered with any of them. Saved uncompressed, so `loadScore` can memory-map it.
+
+        Args:
+            output_dir (str): The directory name to save the score to. Defaults to `output-wavs`
+
+        Returns:
+            str: Path of the saved score.
+        """
+        score_path = f"{output_dir}/{self.track_name}.npz"
+
+        # Compile the notes as written, fixed voices are allocated when the score is rendered
+        with self.profileStage("compile score"):
+            instruments = self.data.instruments
+            notes = [self.notesToArrays(instrument) for instrument in instruments]
+            columns = {
+                "score_version": np.int64(SCORE_VERSION),
+                "sample_rate": np.int64(self.sample_rate),
+                "track_length": np.int64(self.track_length),
+                "name": np.array([instrument.name for instrument in instruments], dtype=str),
+                "program": np.array([instrument.program for instrument in instruments], dtype=np.int64),
+                "is_drum": np.array([instrument.is_drum for instrument in instruments], dtype=bool),
+                "instrument_offsets": np.cumsum([0] + [len(instrument.pitch) for instrument in instruments]),
+                "start": np.concatenate([note.start for note in notes] + [np.zeros(0, dtype=np.int64)]),
+                "end": np.concatenate([note.start + note.length for note in notes] + [np.zeros(0, dtype=np.int64)]),
+                "pitch": np.concatenate([instrument.pitch for instrument in instruments] + [np.zeros(0, dtype=np.int64)]),
+                "frequency": np.concatenate([note.frequency for note in notes] + [np.zeros(0)]),
+                "velocity": np.concatenate([instrument.velocity for instrument in instruments] + [np.zeros(0, dtype=np.int64)]),
+                "time_signatures": np.array(self.time_signatures, dtype=np.float64).reshape(-1, 3),
+                "key_signatures": np.array(self.key_signatures, dtype=np.float64).reshape(-1, 3),
+            }
+            with open(score_path, 'wb') as score_file:
+                np.savez(score_file, **columns)
 
-        # Due to additive synthesis (overlaying waves on top of each other), normalize to prevent clipping
-        self.chiptune_wave = self.chiptune_wave / np.max(np.abs(self.chiptune_wave))
-        self.chiptune_wave = np.tanh(self.chiptune_wave) # Softly limit range to prevent peaks
-        self.chiptune_wave *= LOUDNESS      
+        return score_path
 
-    def saveWAV(self, output_dir="output-wavs"):
+    def saveWAV(self, output_dir="output-wavs", memmap=False, block_size=BLOCK_SIZE, audio_format="wav", play=False):
         """
-        Saves the `chiptune_wave` audio data array to a WAV file. The saved filename matches the original 
-        input MIDI's track name.
+        Saves the `chiptune_wave` audio data array to a WAV file, or a FLAC or OGG file. The saved filename
+        matches the original input MIDI's track name. Audio is converted and written one block at a time by a
+        `WAVWriter` or `EncodedWriter`, so only a block's worth of memory is needed on top of the track.
+        Streamed synthesizers write the blocks of `renderBlocks` as they render instead, never holding the
+        whole song, and compressed blocks are encoded on a separate thread while the next ones render.
 
         Args:
             output_dir (str): The directory name to save the WAV file to. Defaults to `output-wavs`
+            memmap (bool): Whether to write into a memory-mapped output file instead of appending to it.
+            block_size (int): Number of samples converted and written at a time.
+            audio_format (str): Format to save in, one of `AUDIO_FORMATS`, also used as the file extension.
+            play (bool): For streamed synthesizers, whether to play the track while it renders and saves, with
+                `playWhileRendering`. The file then holds exactly the audio played, normalized in a single pass.
+
+        Returns:
+            str: Path of the saved file.
         
         Raises:
             Exception: If `chiptune_wave` is not populated yet, inform user to run converter first.
         """ 
-        # Convert to expected format WAV files expect
-        if self.chiptune_wave.any(): 
-            wav_chiptune_wave = (self.chiptune_wave * 32767).astype(np.int16)
-            write(f"{output_dir}/{self.track_name}.wav", SAMPLE_RATE, wav_chiptune_wave)
+        wav_path = f"{output_dir}/{self.track_name}.{audio_format}"
+
+        if self.stream and play:
+            with self.profileStage(f"play, render and save {audio_format.upper()}"), \
+                    audioWriter(wav_path, self.sample_rate, self.track_length, memmap, audio_format) as wav_writer:
+                self.playWhileRendering(block_size, wav_writer=wav_writer)
+
+        elif self.stream:
+            with self.profileStage(f"render and save {audio_format.upper()}"), \
+                    audioWriter(wav_path, self.sample_rate, self.track_length, memmap, audio_format) as wav_writer:
+                for block in self.renderBlocks(block_size):
+                    wav_writer.write(block)
+
+        elif self.chiptune_wave is not None and self.chiptune_wave.any(): 
+            with self.profileStage(f"save {audio_format.upper()}"), \
+                    audioWriter(wav_path, self.sample_rate, len(self.chiptune_wave), memmap, audio_format) as wav_writer:
+                for start in range(0, len(self.chiptune_wave), block_size):
+                    wav_writer.write(self.chiptune_wave[start:start + block_size])
+
         else:
             raise Exception("No chiptune audio to save. Please call midiToChiptune() before saving audio.")
+
+        return wav_path
     
-    def playChiptune(self):
+    def stemBlocks(self, parts, peak, mix=None):
+        """
+        Normalizes one block of the melody, bassline and percussion parts consistently with the mix. The mix's
+        normalization and `tanh` limiting amount to a gain on every sample, which is applied to each part too,
+        so the stems sum back to the mix and keep the levels they have within it.
+
+        Args:
+            parts (dict): The "melody", "bass" and "percussion" audio of the block, before normalization.
+            peak (float): Highest absolute amplitude of the whole summed track.
+            mix (np.ndarray): The block of the normalized mix if already rendered, or None to normalize it here.
+
+        Returns:
+            dict: The normalized mix ("mix") and stems ("melody", "bass" and "percussion") of the block.
+        """
+        summed = parts["melody"] + parts["bass"]
+        summed += parts["percussion"]
+        if mix is None:
+            mix = self.normalize(summed.copy(), peak)
+
+        # Silent samples have no gain of their own, use the limiter's slope at silence
+        gain = np.full_like(summed, LOUDNESS / (peak or 1.0))
+        np.divide(mix, summed, out=gain, where=summed != 0)
+
+        blocks = {"mix": mix}
+        blocks.update({part: parts[part] * gain for part in PARTS})
+        return blocks
+
+    def saveStems(self, output_dir="output-wavs", memmap=False, block_size=STEM_BLOCK_SIZE, audio_format="wav"):
+        """
+        Saves the melody, bassline and percussion parts as separate WAV files next to the mixed track, all from the
+        one synthesis pass and normalized consistently with the mix by `stemBlocks`. The four WAVs are written
+        block by block, with each block of every file encoded concurrently on a thread pool, since NumPy's
+        conversion and file writes release the GIL. Streamed synthesizers render every block once the peak is
+        known, never holding the whole song.
+
+        Args:
+            output_dir (str): The directory name to save the WAV files to. Defaults to `output-wavs`
+            memmap (bool): Whether to write into memory-mapped output files instead of appending to them.
+            block_size (int): Number of samples converted and written at a time.
+            audio_format (str): Format to save in, one of `AUDIO_FORMATS`, also used as the file extension.
+
+        Returns:
+            dict: Path of the mix ("mix") and of every stem ("melody", "bass" and "percussion").
+
+        Raises:
+            Exception: If `chiptune_wave` is not populated yet, inform user to run converter first.
         """
-        Plays the `chiptune_wave` to computer audio output using the `sounddevice` library.
+        wav_paths = {"mix": f"{output_dir}/{self.track_name}.{audio_format}"}
+        wav_paths.update({part: f"{output_dir}/{self.track_name} ({part}).{audio_format}" for part in PARTS})
+
+        if self.stream:
+            peak = self.scanPeak(block_size)
+            blocks = (self.stemBlocks(parts, peak) for parts in self.mixBlocks(block_size))
+            stage = self.profileStage("render and save stems")
+            length = self.track_length
+
+        elif self.chiptune_wave is not None and self.chiptune_wave.any():
+            waves = {"melody": self.melody_wave, "bass": self.bass_wave, "percussion": self.percussion_wave}
+            blocks = (self.stemBlocks({part: wave[start:start + block_size] for part, wave in waves.items()}, self.peak,
+                                      self.chiptune_wave[start:start + block_size])
+                      for start in range(0, len(self.chiptune_wave), block_size))
+            stage = self.profileStage("save stems")
+            length = len(self.chiptune_wave)
+
+        else:
+            raise Exception("No chiptune audio to save. Please call midiToChiptune() before saving audio.")
+
+        with stage, contextlib.ExitStack() as writers, ThreadPoolExecutor(len(wav_paths)) as pool:
+            wav_writers = {name: writers.enter_context(audioWriter(wav_path, self.sample_rate, length, memmap, audio_format))
+                           for name, wav_path in wav_paths.items()}
+            for block in blocks:
+                list(pool.map(lambda name: wav_writers[name].write(block[name]), wav_writers))
+
+        return wav_paths
+
+    def playChiptune(self, resample=False):
+        """
+        Plays the `chiptune_wave` to computer audio output using the `sounddevice` library. If this synthesizer
+        was constructed to stream, plays the track while it renders with `playWhileRendering` instead.
+
+        Args:
+            resample (bool): Whether to resample audio rendered at another rate, such as drafts, to `SAMPLE_RATE`
+                before playing it, for audio devices that can't play the rendered rate. Streams play unresampled.
 
         Raises:
             Exception: If `chiptune_wave` is not populated yet, inform user to run converter first.
         """
-        if self.chiptune_wave.any():
+        if self.stream:
+            self.playWhileRendering()
+
+        elif self.chiptune_wave is not None and self.chiptune_wave.any():
+            import sounddevice as sd
+
+            audio, sample_rate = self.chiptune_wave, self.sample_rate
+            if resample and sample_rate != SAMPLE_RATE:
+                audio, sample_rate = resampleAudio(audio, sample_rate, SAMPLE_RATE), SAMPLE_RATE
+
             print(f"♪♪♪\tPlaying {self.track_name}\t♪♪♪")
-            sd.play(synth.chiptune_wave, samplerate=SAMPLE_RATE)
+            sd.play(audio, samplerate=sample_rate)
             sd.wait()
             print(f"---\tFinished {self.track_name}\t---")
 
         else:
             raise Exception("No chiptune audio to play. Please call midiToChiptune() before playing audio.")
 
+    def playWhileRendering(self, block_size=BLOCK_SIZE, prefill_blocks=PREFILL_BLOCKS, buffer_blocks=PLAYBACK_BUFFER_BLOCKS,
+                           wav_writer=None):
+        """
+        Plays the track to computer audio output as it renders, rather than after the whole song is synthesized.
+        A background thread renders blocks with single pass normalization into an `AudioRingBuffer`, which a
+        `sounddevice.OutputStream` callback drains. Audio starts once `prefill_blocks` blocks are buffered.
+        With a `wav_writer`, the thread also writes every block to it, saving the track as it plays.
+
+        If rendering falls behind playback, the callback plays silence for the missing samples and counts an
+        underrun, reported once playback finishes.
+
+        Args:
+            block_size (int): Number of samples per rendered block and per output callback.
+            prefill_blocks (int): Number of blocks to buffer before starting audio, also used as the
+                normalization lookahead.
+            buffer_blocks (int): Number of blocks the ring buffer holds before the renderer waits.
+            wav_writer (WAVWriter or EncodedWriter): Writer to save every rendered block with, or None.
+
+        Returns:
+            dict: Number of underruns and the latency in seconds from starting to render until audio started.
+        """
+        import sounddevice as sd
+
+        ring_buffer = AudioRingBuffer(max(buffer_blocks, prefill_blocks) * block_size, self.dtype)
+        render_errors = []
+
+        def render():
+            try:
+                for block in self.renderBlocks(block_size, lookahead=prefill_blocks):
+                    ring_buffer.write(block)
+                    if wav_writer is not None: # Written once queued for playback, so saving never delays audio
+                        wav_writer.write(block)
+            except Exception as error: # Surface rendering errors on the main thread
+                render_errors.append(error)
+            finally:
+                ring_buffer.finish()
+
+        underruns = 0
+        finished = threading.Event()
+
+        def callback(outdata, frames, time_info, status):
+            nonlocal underruns
+            channel = outdata[:, 0]
+            count = ring_buffer.read(channel)
+
+            if count < frames:
+                # Fill the rest with silence, either the track ended or rendering fell behind playback
+                channel[count:] = 0
+                if not ring_buffer.finished:
+                    underruns += 1
+                elif count == 0:
+                    raise sd.CallbackStop()
+
+        started = time.perf_counter()
+        renderer = threading.Thread(target=render, daemon=True)
+        renderer.start()
+        ring_buffer.waitFor(prefill_blocks * block_size)
+        latency = time.perf_counter() - started
+
+        print(f"♪♪♪\tPlaying {self.track_name} while rendering\t♪♪♪")
+        with sd.OutputStream(samplerate=self.sample_rate, blocksize=block_size, channels=1, dtype=self.precision,
+                             callback=callback, finished_callback=finished.set):
+            finished.wait()
+        renderer.join()
+
+        if render_errors:
+            raise render_errors[0]
+
+        print(f"---\tFinished {self.track_name}\t---")
+        print(f"Started after {latency:.2f}s, {underruns} underrun{'s' if underruns != 1 else ''}")
+        return {"underruns": underruns, "latency": latency}
+
+# Synthesizer each instrument rendering worker process builds once, for the MIDI its pool was started for.
+worker_synth = None
+
+def initInstrumentWorker(input_midi, disable_adsr, noise_seed, precision, fixed_voices=False, sample_rate=SAMPLE_RATE, draft=False,
+                         backend="numpy"):
+    """
+    Prepares an instrument or segment rendering worker process by parsing the MIDI, without synthesizing anything.
+
+    Args:
+        input_midi (str): The MIDI file path being rendered.
+        disable_adsr (bool): Whether to disable applying an ADSR envelope.
+        noise_seed (int): Seed for the noise of percussion sounds, matching the parent synthesizer.
+        precision (str): Floating point precision to render in, matching the parent synthesizer.
+        fixed_voices (bool): Whether notes play on fixed voices, matching the parent synthesizer.
+        sample_rate (int): Sample rate to render at, matching the parent synthesizer.
+        draft (bool): Whether to render a draft, matching the parent synthesizer.
+        backend (str): Backend to synthesize notes with, matching the parent synthesizer.
+    """
+    global worker_synth
+    worker_synth = MidiToChiptune(input_midi, disable_adsr, stream=True, noise_seed=noise_seed, precision=precision,
+                                  fixed_voices=fixed_voices, sample_rate=sample_rate, draft=draft, backend=backend)
+
+def renderInstrumentWorker(index):
+    """
+    Renders one instrument of the worker's MIDI in an instrument rendering worker process.
+
+    Args:
+        index (int): Index of the instrument in the MIDI.
+
+    Returns:
+        dict: Audio data for each part the instrument contributes to, from `renderInstrument`.
+    """
+    return worker_synth.renderInstrument(index)
+
+def renderSegmentWorker(segment_start, segment_end):
+    """
+    Renders one time segment of the worker's MIDI in a segment rendering worker process.
+
+    Args:
+        segment_start (int): First sample of the segment.
+        segment_end (int): Sample after the last sample of the segment.
+
+    Returns:
+        dict: Audio data of the segment for each part sounding in it, from `renderWindow`.
+    """
+    return worker_synth.renderWindow(segment_start, segment_end)
+
+def findMidiFiles(paths):
+    """
+    Expands a list of MIDI files and directories into the MIDI files to convert. Directories are searched
+    recursively, so a whole `midi-assets`-style library can be passed at once. Each file keeps its subdirectory
+    within the directory it was found in, so same-named MIDIs of different subdirectories don't overwrite
+    each other's output.
+
+    Args:
+        paths (List[str]): MIDI file and directory paths.
+
+    Returns:
+        List[tuple]: Every MIDI file path found with the subdirectory to save its output in, relative to the
+            output directory ("" for files given directly), directories expanded in sorted order.
+    """
+    midi_files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            midi_files.append((path, ""))
+            continue
+
+        for directory, subdirectories, files in os.walk(path):
+            subdirectories.sort()
+            subdirectory = os.path.relpath(directory, path)
+            subdirectory = "" if subdirectory == os.curdir else subdirectory
+            midi_files += [(os.path.join(directory, file), subdirectory) for file in sorted(files) if file.endswith('.mid')]
+
+    return midi_files
+
+def resampleAudio(wave, sample_rate, target_rate):
+    """
+    Resamples audio to another sample rate with a polyphase filter, e.g. to play a draft at full rate.
+
+    Args:
+        wave (np.ndarray): Audio data at `sample_rate`.
+        sample_rate (int): Sample rate of the audio.
+        target_rate (int): Sample rate to resample to.
+
+    Returns:
+        np.ndarray: The audio at `target_rate`, in the same precision.
+    """
+    from scipy.signal import resample_poly
+
+    divisor = np.gcd(sample_rate, target_rate)
+    return resample_poly(wave, target_rate // divisor, sample_rate // divisor).astype(wave.dtype, copy=False)
+
+def playWAV(wav_path):
+    """
+    Plays a WAV file to computer audio output using the `sounddevice` library, used for cached renders.
+
+    Args:
+        wav_path (str): Path of the WAV file to play.
+    """
+    import sounddevice as sd
+    from scipy.io.wavfile import read
+
+    track_name = os.path.splitext(os.path.basename(wav_path))[0]
+    sample_rate, audio_data = read(wav_path)
+
+    print(f"♪♪♪\tPlaying {track_name}\t♪♪♪")
+    sd.play(audio_data, samplerate=sample_rate)
+    sd.wait()
+    print(f"---\tFinished {track_name}\t---")
+
+def convertMidi(input_midi, output_dir, disable_adsr, cache_dir=None, precision="float64", fixed_voices=False, stems=False,
+                backend="numpy", audio_format="wav"):
+    """
+    Synthesizes a MIDI file into a chiptune WAV without playing it. Runs inside the batch conversion worker
+    processes, which keep their imports loaded between files.
+
+    Args:
+        input_midi (str): The MIDI file path to convert.
+        output_dir (str): The directory to save the WAV file to.
+        disable_adsr (bool): Whether to disable applying an ADSR envelope.
+        cache_dir (str): Directory of the render cache to check and fill, or None to bypass the cache.
+        precision (str): Floating point precision to render in, one of `PRECISIONS`.
+        fixed_voices (bool): Whether to play notes on the fixed voices of `VOICE_CHANNELS`.
+        stems (bool): Whether to also save the melody, bass and percussion stems, see `saveStems`. The render
+            cache only holds mixes, so stems are always synthesized, reusing cached instrument stems.
+        backend (str): Backend to synthesize notes with, one of `BACKENDS`.
+        audio_format (str): Format to save in, one of `AUDIO_FORMATS`. The render cache only holds WAVs, so
+            compressed files are always synthesized, reusing cached instrument stems.
+
+    Returns:
+        dict: The track name, seconds of audio produced, seconds spent converting and whether it was cached.
+    """
+    started = time.perf_counter()
+    track_name = os.path.splitext(os.path.basename(input_midi))[0]
+    wav_path = os.path.join(output_dir, f"{track_name}.wav")
+
+    cache = RenderCache(cache_dir) if cache_dir else None
+    if cache and not stems and audio_format == "wav":
+        key = cache.key(input_midi, disable_adsr, precision=precision, fixed_voices=fixed_voices)
+        if cache.fetch(key, wav_path):
+            # Cached WAVs are written by WAVWriter, a fixed size header followed by 16-bit mono samples
+            samples = (os.path.getsize(wav_path) - WAV_HEADER_SIZE) // 2
+            return {
+                "track_name": track_name,
+                "audio_seconds": samples / SAMPLE_RATE,
+                "render_seconds": time.perf_counter() - started,
+                "cached": True,
+            }
+
+    stem_cache = StemCache(os.path.join(cache_dir, STEM_CACHE_SUBDIR)) if cache else None
+    synth = MidiToChiptune(input_midi, disable_adsr, stem_cache=stem_cache, precision=precision, fixed_voices=fixed_voices,
+                           backend=backend)
+    if stems:
+        synth.saveStems(output_dir, audio_format=audio_format)
+    else:
+        synth.saveWAV(output_dir, audio_format=audio_format)
+        if cache and audio_format == "wav":
+            cache.store(key, wav_path)
+
+    return {
+        "track_name": synth.track_name,
+        "audio_seconds": synth.track_length / synth.sample_rate,
+        "render_seconds": time.perf_counter() - started,
+        "cached": False,
+    }
+
+def batchConvert(paths, output_dir, disable_adsr, workers=None, cache_dir=None, precision="float64", fixed_voices=False, stems=False,
+                 backend="numpy", audio_format="wav"):
+    """
+    Converts many MIDI files to chiptune WAVs on a process pool, never playing audio. Prints each file as it
+    finishes with its realtime factor (seconds of audio rendered per second of work), then a summary.
+
+    Args:
+        paths (List[str]): MIDI files and directories of MIDI files to convert.
+        output_dir (str): The directory to save every WAV file to, under the subdirectory its MIDI was found in
+            within an input directory.
+        disable_adsr (bool): Whether to disable applying an ADSR envelope.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        cache_dir (str): Directory of the render cache to check and fill, or None to bypass the cache.
+        precision (str): Floating point precision to render in, one of `PRECISIONS`.
+        fixed_voices (bool): Whether to play notes on the fixed voices of `VOICE_CHANNELS`.
+        stems (bool): Whether to also save the melody, bass and percussion stems of every file.
+        backend (str): Backend to synthesize notes with, one of `BACKENDS`.
+        audio_format (str): Format to save every file in, one of `AUDIO_FORMATS`.
+
+    Returns:
+        tuple: Results of `convertMidi` for every converted file, and the number of files that failed.
+
+    Raises:
+        ValueError: If several input MIDIs would be saved under the same output path.
+    """
+    midi_files = findMidiFiles(paths)
+    results = []
+    failures = 0
+
+    # Files given directly, or found in several input directories, can still share an output path
+    output_names = collections.Counter(os.path.join(subdirectory, os.path.splitext(os.path.basename(midi_file))[0])
+                                       for midi_file, subdirectory in midi_files)
+    duplicates = sorted(name for name, count in output_names.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"several input MIDIs would be saved as {', '.join(duplicates)}")
+
+    for subdirectory in sorted({subdirectory for _, subdirectory in midi_files}):
+        os.makedirs(os.path.join(output_dir, subdirectory), exist_ok=True)
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convertMidi, midi_file, os.path.join(output_dir, subdirectory), disable_adsr, cache_dir, precision,
+                               fixed_voices, stems, backend, audio_format): midi_file for midi_file, subdirectory in midi_files}
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error: # Keep converting the rest of the library
+                failures += 1
+                print(f"Failed\t{futures[future]}: {error}")
+                continue
+
+            results.append(result)
+            realtime_factor = result["audio_seconds"] / result["render_seconds"]
+            cached = " (cached)" if result["cached"] else ""
+            print(f"{realtime_factor:7.1f}x realtime\t{result['render_seconds']:6.2f}s\t{result['track_name']}{cached}")
+
+    elapsed = time.perf_counter() - started
+    print("--------------------")
+    print(f"Converted {len(results)} of {len(midi_files)} files in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.2f} files/sec){f', {failures} failed' if failures else ''}")
+    return results, failures
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(description="Chiptune Synthesizer")
     
     # Required Argument, path to MIDI file to synthesize chiptune waves with:
-    ap.add_argument("input_midi", help="File path to the input MIDI file.")
+    ap.add_argument("input_midi", nargs="*", help="File path to the input MIDI file. With --batch, any number of MIDI files or directories.")
 
     # Optional Arguments
     ap.add_argument('--output', default="output-wavs", help="Directory to generate the chiptune WAV into. Defaults to `output-wavs`.")
     ap.add_argument('--no-play', action="store_true", help="Do not play the chiptune wave to audio output.")
     ap.add_argument('--disable-adsr', action="store_true", help="Disable applying an ADSR envelope.")
+    ap.add_argument('--stream', action="store_true", help="Play the chiptune while it renders instead of after, saving it as it plays. With --no-play, renders block by block straight into the WAV.")
+    ap.add_argument('--batch', action="store_true", help="Convert every input MIDI file and directory on a process pool, without playing audio.")
+    ap.add_argument('--workers', type=int, default=None, help="Number of worker processes for --batch. Defaults to the number of CPUs.")
+    ap.add_argument('--instrument-workers', type=int, default=1, help="Number of instruments to render concurrently. Defaults to 1.")
+    ap.add_argument('--segment-workers', type=int, default=1, help="Number of processes to render the song on, each taking segments of its timeline. Defaults to 1.")
+    ap.add_argument('--instrument-pool', choices=["thread", "process"], default="thread", help="Pool to render instruments concurrently on. Defaults to `thread`.")
+    ap.add_argument('--cache-dir', default=RENDER_CACHE_DIR, help="Directory of the render cache. Defaults to `~/.cache/chiptune-synthesizer`.")
+    ap.add_argument('--no-cache', action="store_true", help="Bypass the render cache, always synthesizing and never storing renders.")
+    ap.add_argument('--clear-cache', action="store_true", help="Remove every cached render before converting.")
+    ap.add_argument('--memmap-wav', action="store_true", help="Write the WAV through a memory-mapped output file.")
+    ap.add_argument('--profile', action="store_true", help="Print the time and allocations of every stage and instrument of the render.")
+    ap.add_argument('--profile-trace', default=None, help="With --profile, also write the profiled stages to this file as a JSON trace.")
+    ap.add_argument('--compile-score', action="store_true", help="Compile the MIDI into a `.npz` score in the output directory instead of rendering it. Scores render without parsing the MIDI.")
+    ap.add_argument('--format', choices=AUDIO_FORMATS, default="wav", help="Format to save renders in, `flac` and `ogg` are compressed with soundfile. Defaults to `wav`.")
+    ap.add_argument('--backend', choices=BACKENDS, default="numpy", help="Backend to synthesize melody and bass notes with, `numba` compiles a fused kernel when Numba is installed. Defaults to `numpy`.")
+    ap.add_argument('--precision', choices=PRECISIONS, default="float64", help="Floating point precision to render in, float32 halves memory use. Defaults to `float64`.")
+    ap.add_argument('--fixed-voices', action="store_true", help="Play notes on the NES's fixed voices (2 pulse, 1 triangle, 1 noise), cutting notes short when a channel runs out.")
+    ap.add_argument('--start', type=float, default=None, help="Only render the song from this time in seconds, e.g. to preview a few bars.")
+    ap.add_argument('--end', type=float, default=None, help="Only render the song until this time in seconds.")
+    ap.add_argument('--draft', action="store_true", help=f"Render a quick preview at {DRAFT_SAMPLE_RATE} Hz with simplified envelopes, saved as `(draft)`. Bypasses the render cache.")
+    ap.add_argument('--draft-resample', action="store_true", help=f"With --draft, resample to {SAMPLE_RATE} Hz before playing, for devices that can't play the draft rate.")
+    ap.add_argument('--stems', action="store_true", help="Also save the melody, bass and percussion stems from the same render, as `{name} ({part}).wav`.")
     args = ap.parse_args()
 
-    # Construct the Chiptune Wave
-    synth = MidiToChiptune(args.input_midi, args.disable_adsr)
+    if args.clear_cache:
+        RenderCache(args.cache_dir).clear()
+        StemCache(os.path.join(args.cache_dir, STEM_CACHE_SUBDIR)).clear()
+        print(f"Cleared render cache {args.cache_dir}")
+        if not args.input_midi:
+            raise SystemExit()
+
+    if not args.input_midi:
+        ap.error("the following arguments are required: input_midi")
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    render_range = args.start is not None or args.end is not None
+    if render_range and (args.batch or args.stream):
+        ap.error("--start and --end cannot be combined with --batch or --stream")
+    if args.start is not None and args.start < 0:
+        ap.error("--start cannot be negative")
+    if args.end is not None and (args.start or 0.0) >= args.end:
+        ap.error("--start must be before --end")
+    if args.draft and args.batch:
+        ap.error("--draft cannot be combined with --batch")
+    if args.compile_score and (args.batch or args.stream or render_range):
+        ap.error("--compile-score cannot be combined with --batch, --stream, --start or --end")
+    if args.memmap_wav and args.format != "wav":
+        ap.error("--memmap-wav only applies to --format wav")
+    if args.segment_workers > 1 and args.stream:
+        ap.error("--segment-workers cannot be combined with --stream")
+
+    if args.batch:
+        try:
+            _, failures = batchConvert(args.input_midi, args.output, args.disable_adsr, args.workers, cache_dir, args.precision,
+                                       args.fixed_voices, args.stems, args.backend, args.format)
+        except ValueError as error:
+            ap.error(str(error))
+        raise SystemExit(1 if failures else 0)
+
+    if len(args.input_midi) > 1:
+        ap.error("multiple input MIDI files require --batch")
+    args.input_midi = args.input_midi[0]
+
+    # Scores are compiled at the sample rate they will render at, so --draft compiles a draft score
+    if args.compile_score:
+        synth = MidiToChiptune(args.input_midi, args.disable_adsr, render=False, draft=args.draft)
+        print(f"Compiled score into {synth.saveScore(args.output)}")
+        raise SystemExit()
+
+    # Return a cached render of the same MIDI and settings without parsing or synthesizing. Profiled runs
+    # always synthesize, so there is something to measure. Ranges and drafts are quick previews, never cached.
+    # Only WAV mixes are cached, so stems and compressed files are synthesized, though still from cached instrument stems.
+    use_cache = cache_dir and not (args.stream or args.profile or render_range or args.draft)
+    cache = RenderCache(cache_dir) if use_cache and not args.stems and args.format == "wav" else None
+    if cache:
+        cache_key = cache.key(args.input_midi, args.disable_adsr, precision=args.precision, fixed_voices=args.fixed_voices)
+        wav_path = os.path.join(args.output, f"{os.path.splitext(os.path.basename(args.input_midi))[0]}.wav")
+
+        if cache.fetch(cache_key, wav_path):
+            print(f"Loaded cached render into {wav_path}")
+            if not args.no_play:
+                print()
+                playWAV(wav_path)
+            raise SystemExit()
+
+    # Construct the Chiptune Wave, streamed synths render while playing. Instruments unchanged since an
+    # earlier render of the MIDI are reused from the stem cache, so editing one track only re-renders it
+    stem_cache = StemCache(os.path.join(cache_dir, STEM_CACHE_SUBDIR)) if use_cache else None
+    profiler = StageProfiler() if args.profile else None
+    synth = MidiToChiptune(args.input_midi, args.disable_adsr, stream=args.stream,
+                           instrument_workers=args.instrument_workers, instrument_pool=args.instrument_pool,
+                           segment_workers=args.segment_workers, stem_cache=stem_cache, precision=args.precision,
+                           profiler=profiler, fixed_voices=args.fixed_voices, render=not render_range,
+                           draft=args.draft, backend=args.backend)
+
+    # Only synthesize the requested window, saved under its own name next to full renders
+    if render_range:
+        song_seconds = synth.track_length / synth.sample_rate
+        start = args.start or 0.0
+        end = args.end if args.end is not None else song_seconds
+        if start >= song_seconds:
+            ap.error(f"--start {start:g} is past the end of the {song_seconds:.2f}s song")
+        if int(start * synth.sample_rate) >= int(end * synth.sample_rate):
+            ap.error("--start and --end must be at least one sample apart")
+        synth.renderRange(start, end)
+        synth.track_name = f"{synth.track_name} ({start:g}s-{end:g}s)"
 
     # Show the Results
     synth.printMidiInfo()
-    synth.saveWAV(args.output)
+    synth.printCacheStats()
+    # Streamed tracks are saved while they play, rather than rendered once to save and again to play
+    play_while_saving = args.stream and not args.no_play and not args.stems
+    if args.stems:
+        synth.saveStems(args.output, memmap=args.memmap_wav, audio_format=args.format)
+    else:
+        if play_while_saving:
+            print()
+        synth.saveWAV(args.output, memmap=args.memmap_wav, audio_format=args.format, play=play_while_saving)
+    if cache:
+        cache.store(cache_key, wav_path)
+
+    if profiler:
+        print()
+        profiler.printTable()
+        if args.profile_trace:
+            profiler.writeTrace(args.profile_trace)
+            print(f"Wrote profile trace to {args.profile_trace}")
     
-    if not args.no_play:
+    if not args.no_play and not play_while_saving:
         print()
-        synth.playChiptune()
+        synth.playChiptune(resample=args.draft_resample)
@@ -0,0 +1,33 @@
+import importlib.util
+import os
+import sys
+
+# The synthesizer's file name has a hyphen, so scripts load it from its path rather than importing it by name
+SYNTH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chiptune-synthesizer.py")
+
+# Name the synthesizer is registered under in `sys.modules`
+SYNTH_MODULE = "chiptune_synthesizer"
+
+def loadSynthesizer(synth_path=SYNTH_PATH):
+    """
+    Loads the synthesizer module from its path, once per process. It is registered in `sys.modules`, so its
+    worker functions can be sent to the processes of instrument, segment and server pools.
+
+    Args:
+        synth_path (str): Path of `chiptune-synthesizer.py`.
+
+    Returns:
+        module: The loaded synthesizer.
+    """
+    if SYNTH_MODULE in sys.modules:
+        return sys.modules[SYNTH_MODULE]
+
+    spec = importlib.util.spec_from_file_location(SYNTH_MODULE, synth_path)
+    chiptune = importlib.util.module_from_spec(spec)
+    sys.modules[SYNTH_MODULE] = chiptune
+    try:
+        spec.loader.exec_module(chiptune)
+    except BaseException:
+        del sys.modules[SYNTH_MODULE]
+        raise
+    return chiptune
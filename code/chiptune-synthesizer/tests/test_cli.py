@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SYNTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNTH_PATH = os.path.join(SYNTH_DIR, "chiptune-synthesizer.py")
+
+# A short MIDI (about 3 seconds) from the bundled assets
+SHORT_MIDI = os.path.join(SYNTH_DIR, "midi-assets", "Kirby's Return to Dreamland - Channel Menu.mid")
+
+def runSynthesizer(*args):
+    """
+    Runs the synthesizer's command line without playing audio.
+
+    Returns:
+        subprocess.CompletedProcess: The finished run, with its output captured as text.
+    """
+    return subprocess.run([sys.executable, SYNTH_PATH, *args, "--no-play", "--no-cache"], capture_output=True,
+                          text=True, timeout=120)
+
+@pytest.mark.parametrize("window, message", [
+    (["--start", "999"], "is past the end of the"),
+    (["--start", "2", "--end", "1"], "--start must be before --end"),
+    (["--start", "-1"], "--start cannot be negative"),
+])
+def test_invalid_render_range_is_a_usage_error(tmp_path, window, message):
+    completed = runSynthesizer(SHORT_MIDI, "--output", str(tmp_path), *window)
+
+    assert completed.returncode == 2
+    assert message in completed.stderr
+    assert "Traceback" not in completed.stderr
+    assert os.listdir(tmp_path) == []
+
+def test_valid_render_range_saves_window(tmp_path):
+    completed = runSynthesizer(SHORT_MIDI, "--output", str(tmp_path), "--start", "1", "--end", "2")
+
+    assert completed.returncode == 0, completed.stderr
+    assert os.listdir(tmp_path) == ["Kirby's Return to Dreamland - Channel Menu (1s-2s).wav"]
@@ -0,0 +1,80 @@
+import importlib.util
+import os
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+SYNTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SYNTH_DIR)
+
+from chiptune_loader import loadSynthesizer
+
+chiptune = loadSynthesizer()
+
+class CallbackStop(Exception):
+    pass
+
+class OutputStream:
+    """
+    Stands in for `sounddevice.OutputStream`, draining the callback as fast as it fills instead of in real time.
+    """
+    def __init__(self, samplerate, blocksize, channels, dtype, callback, finished_callback):
+        self.blocksize, self.dtype, self.callback, self.finished_callback = blocksize, dtype, callback, finished_callback
+
+    def run(self):
+        while True:
+            outdata = np.zeros((self.blocksize, 1), dtype=self.dtype)
+            try:
+                self.callback(outdata, self.blocksize, None, None)
+            except CallbackStop:
+                break
+        self.finished_callback()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.thread.join()
+
+@pytest.fixture
+def fakeSounddevice(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sounddevice", types.SimpleNamespace(OutputStream=OutputStream,
+                                                                        CallbackStop=CallbackStop))
+
+@pytest.fixture
+def midiPath(tmp_path):
+    """
+    A 3 second MIDI of a loud opening chord then quieter melody, bass and drums. Its peak is heard first, so single
+    pass normalization while playing reaches the same level as a full render.
+    """
+    spec = importlib.util.spec_from_file_location("chiptune_benchmark", os.path.join(SYNTH_DIR, "chiptune-benchmark.py"))
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+
+    chord = [(0.0, 0.3, pitch, 127) for pitch in (60, 64, 67)]
+    melody = [(0.3 + 0.25 * step, 0.5 + 0.25 * step, 72 + step % 5, 50) for step in range(10)]
+    bass = [(0.3 + 0.5 * step, 0.75 + 0.5 * step, 36 + step % 3, 50) for step in range(5)]
+    drums = [(0.25 * step, 0.35 + 0.25 * step, 38 if step % 2 else 36, 40) for step in range(12)]
+    midi_path = str(tmp_path / "song.mid")
+    benchmark.writeMidi(midi_path, [(0, False, chord + melody), (32, False, bass), (0, True, drums)])
+    return midi_path
+
+def test_stream_saves_what_it_plays(tmp_path, midiPath, fakeSounddevice):
+    streamed_dir, full_dir = tmp_path / "streamed", tmp_path / "full"
+    streamed_dir.mkdir()
+    full_dir.mkdir()
+
+    streamed = chiptune.MidiToChiptune(midiPath, False, stream=True)
+    streamed_path = streamed.saveWAV(str(streamed_dir), play=True)
+    full_path = chiptune.MidiToChiptune(midiPath, False).saveWAV(str(full_dir))
+
+    _, saved = wavfile.read(streamed_path)
+    _, expected = wavfile.read(full_path)
+    assert len(saved) == len(expected) == streamed.track_length
+    np.testing.assert_allclose(saved, expected, atol=1)
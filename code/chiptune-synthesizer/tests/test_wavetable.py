@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import signal
+
+SYNTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SYNTH_DIR)
+
+from chiptune_loader import loadSynthesizer
+
+chiptune = loadSynthesizer()
+
+# Table size small enough to check every entry against the direct formulas
+TABLE_SIZE = 256
+
+@pytest.fixture
+def oscillator():
+    return chiptune.WavetableOscillator(table_size=TABLE_SIZE)
+
+@pytest.mark.parametrize("waveform, direct", [
+    ("square", lambda phase: np.sign(np.sin(phase))),
+    ("sawtooth", lambda phase: signal.sawtooth(phase)),
+    ("triangle", lambda phase: signal.sawtooth(phase, 0.5)),
+    ("sine", np.sin),
+])
+def test_table_matches_direct_waveform(oscillator, waveform, direct):
+    cycles = np.arange(TABLE_SIZE) / TABLE_SIZE
+
+    np.testing.assert_allclose(oscillator.lookup(waveform, cycles), direct(2 * np.pi * cycles), atol=1e-12)
+
+def test_phase_accumulator_wraps_whole_cycles(oscillator):
+    cycles = np.arange(TABLE_SIZE) / TABLE_SIZE
+
+    np.testing.assert_array_equal(oscillator.lookup("square", cycles + 3), oscillator.lookup("square", cycles))
+
+def test_unsupported_waveform_raises(oscillator):
+    with pytest.raises(Exception, match="is not a supported waveform"):
+        oscillator.lookup("pulse", np.zeros(4))
@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.io import wavfile
 from scipy.fft import irfft, rfft, rfftfreq
 from scipy.signal import butter, sosfilt, sosfilt_zi
@@ -53,10 +54,31 @@ def makeFilter(cutoffs, filter_type, sample_rate):
 
     return sos
 
-def measureWithFFT(window_data, sample_rate):
+def bandBins(window_size, sample_rate):
     """
-    Applies a real FFT using [`scipy.rfft`](https://docs.scipy.org/doc/scipy/reference/generated/scipy.fft.rfft.html) 
-    to a window of audio data, extracting the frequencies and magnitudes.
+    Finds which FFT bins fall within the low, mid, and high bands for windows of a given size. The frequencies
+    from [`scipy.rfftfreq`](https://docs.scipy.org/doc/scipy/reference/generated/scipy.fft.rfftfreq.html) only
+    increase, so each band is one contiguous range of bins, found once instead of masking every window.
+
+    Args:
+        window_size (int): Number of samples in each window.
+        sample_rate (int): Number of samples per second of the audio.
+
+    Returns:
+        bins (list): (start, end) bin index ranges of the 0-300 Hz, 301-2000 Hz and 2000+ Hz bands.
+    """
+    frequencies = rfftfreq(window_size, d=1/sample_rate)
+    low_end = np.searchsorted(frequencies, 300, side='right')
+    mid_end = np.searchsorted(frequencies, 2000, side='right')
+
+    return [(0, low_end), (low_end, mid_end), (mid_end, len(frequencies))]
+
+def measureBandEnergies(channel, sample_rate, window_size, window_move, batch_windows=256):
+    """
+    Measures the low, mid, and high band energies of every window of a channel in one batched pass. Windows are
+    framed as rows of a strided view over the channel, then a 2-D real FFT using
+    [`scipy.rfft`](https://docs.scipy.org/doc/scipy/reference/generated/scipy.fft.rfft.html) transforms every
+    window at once, and each band's energy is the **average** magnitude of its range of bins.
 
     Real FFT is used since the FFT of real-valued inputs (e.g. an audio signal) results in a symmetric
     complex conjugate sequence, where positive frequency components have a corresponding negative component.
@@ -64,44 +86,57 @@ def measureWithFFT(window_data, sample_rate):
     Reference: https://docs.scipy.org/doc/scipy/tutorial/fft.html#
 
     Args:
-        window_data (np.array): Segment of the audio data.
+        channel (np.array): One channel of the audio data.
         sample_rate (int): Number of samples per second of the audio.
+        window_size (int): Number of samples in each window to apply FFT on.
+        window_move (int): Number of samples between the starts of consecutive windows.
+        batch_windows (int): Number of windows transformed together. Small batches stay in the CPU cache and
+            bound memory on long files.
 
     Returns:
-        frequencies (np.array): Array of positive frequencies from the FFT result.
-        magnitudes (np.array): Array of magnitudes for each frequency component.
+        energies (np.array): Low, mid, and high energy of each window, one row per window.
     """
-    fft_result = rfft(window_data)
-
-    # Since the FFT result is complex (real and imaginary parts), absolute value will calculate √(a² + b²)
-    # for the two parts, obtaining single values representing the relative strength of each frequency.
-    # Reference: https://realpython.com/python-scipy-fft/
-    magnitudes = np.abs(fft_result)
-    frequencies = rfftfreq(len(window_data), d=1/sample_rate)
-
-    return frequencies, magnitudes
-
-def calculateBandEnergy(frequencies, magnitudes):
+    num_windows = max((len(channel) - window_size) // window_move + 1, 0)
+    bins = bandBins(window_size, sample_rate)
+    energies = np.zeros((num_windows, len(bins)))
+    if num_windows == 0:
+        return energies
+
+    # Each row views window_size samples starting window_move after the previous row, no samples are copied
+    windows = sliding_window_view(channel, window_size)[::window_move][:num_windows]
+
+    for start in range(0, num_windows, batch_windows):
+        # Since the FFT result is complex (real and imaginary parts), absolute value will calculate √(a² + b²)
+        # for the two parts, obtaining single values representing the relative strength of each frequency.
+        # Reference: https://realpython.com/python-scipy-fft/
+        magnitudes = np.abs(rfft(windows[start:start + batch_windows], axis=-1))
+        for band, (first_bin, end_bin) in enumerate(bins):
+            energies[start:start + batch_windows, band] = magnitudes[:, first_bin:end_bin].mean(axis=-1)
+        # If looking for peak energy, can use max(axis=-1)
+
+    return energies
+
+def bandGains(energies):
     """
-    Take frequencies and magnitudes supplied from an FFT result and sums the magnitudes within defined 
-    low, mid, and high band boundaries. Used for calculating the total sound energy for each band.
+    Calculates the gain of each band for every window at once, the multiplier for adjusting each band's energy
+    towards the window's overall average energy.
 
     Args:
-        magnitudes (np.array): Magnitudes extracted from an FFT operation.
-        frequencies (np.array): Frequencies extracted from an FFT operation.
-    
+        energies (np.array): Low, mid, and high energy of each window, from `measureBandEnergies`.
+
     Returns:
-        low_energy (float): Energy in the 0-300 Hz range.
-        mid_energy (float): Energy in the 301-2000 Hz range.
-        high_energy (float): Energy in the 2000+ Hz range.
+        gains (np.array): Low, mid, and high gain of each window, one row per window.
     """
-    # Filter magnitude elements to sum based on frequency value.
-    low_energy = np.average(magnitudes[(frequencies >= 0) & (frequencies <= 300)])
-    mid_energy = np.average(magnitudes[(frequencies > 300) & (frequencies <= 2000)])
-    high_energy = np.average(magnitudes[frequencies > 2000])
-    # If looking for peak energy, can use np.max()
+    low_energy, mid_energy, high_energy = energies.T
+    average_energy = ((low_energy + mid_energy + high_energy) / 3)[:, np.newaxis]
+
+    # Set a threshold to turn off low-energy bands
+    energy_threshold = 0.15 * average_energy
 
-    return low_energy, mid_energy, high_energy
+    # Adjust gains with slight boosts for high frequencies if they’re being attenuated too much
+    with np.errstate(divide='ignore', invalid='ignore'): # Bands under the threshold are replaced below
+        gains = np.sqrt(average_energy / energies)
+    return np.where(energies > energy_threshold, gains, [0.8, 1.0, 1.2])
 
 def toneEqualizer(audio_data: np.ndarray, sample_rate, window_size=1024, window_move=512):
     """
@@ -138,32 +173,21 @@ def toneEqualizer(audio_data: np.ndarray, sample_rate, window_size=1024, window_
     channels = [audio_data] if not stereo_bool else audio_data.T
     adjusted_channels = []
 
+    # Apply a window function to smooth the edges, the same for every window
+    window_function = np.hanning(window_size)
+
     for channel in channels:
         adjusted_channel = np.zeros(len(channel))
-        num_windows = (len(channel) - window_size) // window_move + 1
 
-        for window_position in range(num_windows):
+        # Measure sound energy using FFT and calculate the gains of every window in one pass
+        gains = bandGains(measureBandEnergies(channel, sample_rate, window_size, window_move))
+
+        for window_position, (low_gain, mid_gain, high_gain) in enumerate(gains):
             # Determine which array elements in audio to place window
             start = window_position * window_move
             end = start + window_size
             window_data = channel[start:end]
 
-            # Measure sound energy using FFT
-            frequencies, magnitudes = measureWithFFT(window_data, sample_rate)
-            
-            # Calculate energy in each band tier
-            low_energy, mid_energy, high_energy = calculateBandEnergy(frequencies, magnitudes)
-            average_energy = (low_energy + mid_energy + high_energy) / 3
-
-            # Set a threshold to turn off low-energy bands
-            energy_threshold = 0.15 * average_energy
-
-            # Gain calculation, multiplier for adjusting energy to the desired balance
-            # Adjust gains with slight boosts for high frequencies if they’re being attenuated too much
-            low_gain = np.sqrt(average_energy / low_energy) if low_energy > energy_threshold else 0.8
-            mid_gain = np.sqrt(average_energy / mid_energy) if mid_energy > energy_threshold else 1.0
-            high_gain = np.sqrt(average_energy / high_energy) if high_energy > energy_threshold else 1.2
-            
             # Filter each frequency and scale to make the energies roughly equal
             # Scipy assumes there's 0s from the previous block if not given context of zi
             low_band, low_state = sosfilt(low_filter, window_data * low_gain, zi=low_state)
@@ -171,8 +195,6 @@ def toneEqualizer(audio_data: np.ndarray, sample_rate, window_size=1024, window_
             high_band, high_state = sosfilt(high_filter, window_data * high_gain, zi=high_state)
 
             # Sum the bands to get the adjusted signal for this window
-            # Apply a window function to smooth the edges
-            window_function = np.hanning(window_size)
             adjusted_window = (low_band + mid_band + high_band) * window_function
             adjusted_channel[start:end] += adjusted_window[:end - start]
 